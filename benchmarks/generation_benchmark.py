@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-token decode latency of OCREngine, eager vs compile_generation
+
+Times OCREngine._generate, the call every extraction path ends in, once with
+the engine's compiled static-cache generation and once without it, on the
+same inputs. By default the configured model runs on a blank letter-size
+page; --random uses a small randomly initialized Qwen2.5-VL from a text-only
+prompt instead, so no weights are needed.
+
+Compiled generation only applies on CUDA: the engine ignores
+``compile_generation`` on CPU, where compiling gave no consistent speedup
+(0.9x-1.2x over repeated runs on a small random decoder). The benchmark
+therefore needs a GPU:
+
+    python benchmarks/generation_benchmark.py --random
+    python benchmarks/generation_benchmark.py -c config/default.json
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import torch
+from PIL import Image
+from transformers import StoppingCriteriaList
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.pdf_extractor import Config, OCREngine
+from src.pdf_extractor.bench import RandomModelEngine
+from src.pdf_extractor.ocr_engine import _StopAfterCriteria
+from src.pdf_extractor.utils import load_config
+
+
+def page_inputs(engine, config):
+    """Model inputs for a blank letter-size page, bucketed as in compiled mode."""
+    zoom = config.dpi / 72.0
+    blank = Image.new("RGB", (int(8.5 * 72 * zoom), int(11 * 72 * zoom)), "white")
+    image = engine._bucket_image(engine.load_and_resize_image(blank))
+    return engine._prepare_inputs(image, config.ocr_prompt)
+
+
+def time_generate(engine, inputs, new_tokens):
+    """Return wall time of one generation of exactly new_tokens tokens.
+    
+    max_new_tokens stays at the configured value, so the static cache keeps
+    one shape (and one compiled graph) for every length measured.
+    """
+    stop = StoppingCriteriaList([_StopAfterCriteria(inputs['input_ids'].shape[1] + new_tokens)])
+    torch.cuda.synchronize()
+    start = time.perf_counter()
+    engine._generate(inputs, stopping_criteria=stop, min_new_tokens=new_tokens)
+    torch.cuda.synchronize()
+    return time.perf_counter() - start
+
+
+def per_token_latency(engine, inputs, new_tokens, runs):
+    """Estimate decode latency per token, excluding prefill.
+    
+    The prefill cost is measured with a one-token generation and subtracted.
+    """
+    # Warm up (includes compilation in compiled mode)
+    time_generate(engine, inputs, new_tokens)
+    
+    samples = []
+    for _ in range(runs):
+        full = time_generate(engine, inputs, new_tokens)
+        first = time_generate(engine, inputs, 1)
+        samples.append((full - first) / (new_tokens - 1))
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-c", "--config", help="Path to configuration file")
+    parser.add_argument("--random", action="store_true",
+                        help="Use a small random Qwen2.5-VL instead of the configured model")
+    parser.add_argument("--prompt-tokens", type=int, default=512,
+                        help="Prompt length in tokens with --random")
+    parser.add_argument("--new-tokens", type=int, default=128, help="Generated tokens per run")
+    parser.add_argument("--runs", type=int, default=3, help="Timed runs per mode")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+    
+    if not torch.cuda.is_available():
+        parser.exit(1, "compile_generation only applies on CUDA; no GPU is available\n")
+    
+    config = Config.from_dict({
+        **load_config(args.config).to_dict(),
+        'compile_generation': True,
+        'compile_warmup': False,
+        'max_new_tokens': max(args.new_tokens, 2),
+    })
+    engine_cls = RandomModelEngine if args.random else OCREngine
+    engine = engine_cls(config)
+    compile_config = engine._compile_config
+    if args.random:
+        inputs = engine.prompt_inputs(args.prompt_tokens)
+    else:
+        inputs = page_inputs(engine, config)
+    
+    # One engine and model for both modes; eager mode is the engine without
+    # its compile config, exactly as with compile_generation off
+    engine._compile_config = None
+    eager = per_token_latency(engine, inputs, args.new_tokens, args.runs)
+    engine._compile_config = compile_config
+    compiled = per_token_latency(engine, inputs, args.new_tokens, args.runs)
+    engine.close()
+    
+    results = {
+        'model': 'random' if args.random else config.model_path,
+        'device': str(engine.model.device),
+        'prompt_tokens': inputs['input_ids'].shape[1],
+        'new_tokens': args.new_tokens,
+        'eager_ms_per_token': round(eager * 1000, 3),
+        'compiled_ms_per_token': round(compiled * 1000, 3),
+        'speedup': round(eager / compiled, 2),
+    }
+    
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"Model:               {results['model']} on {results['device']}")
+        print(f"Eager (dynamic):     {results['eager_ms_per_token']:.2f} ms/token")
+        print(f"Compiled (static):   {results['compiled_ms_per_token']:.2f} ms/token")
+        print(f"Speedup:             {results['speedup']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,96 +7,412 @@ equations, and other elements from PDF documents.
 """
 
 import argparse
+import json
 import logging
+import sqlite3
 import sys
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, List, Optional
 
-from src.pdf_extractor import OCREngine, PDFProcessor, Config
-from src.pdf_extractor.utils import setup_logging, save_results, load_config, validate_file_path
+from PIL import Image
 
+from src.pdf_extractor import OCREngine, ImageProcessor, Config, ResultStore
+from src.pdf_extractor import bench
+from src.pdf_extractor.batch import run_batch
+from src.pdf_extractor.job_queue import JobQueue, run_worker
+from src.pdf_extractor.pipeline import document_page_count, extract_document, iter_document_pages
+from src.pdf_extractor.scheduler import run_scheduled
+from src.pdf_extractor.image_processor import SUPPORTED_EXTENSIONS
+from src.pdf_extractor.utils import (
+    setup_logging, save_results, load_config, validate_file_path, file_fingerprint,
+    sequence_fingerprint, read_manifest
+)
 
-def process_pdf(pdf_path: str, config: Config, output_path: Optional[str] = None) -> None:
-    """Process a PDF file and extract information.
+
+def process_pages(pages: Iterable[Image.Image], source_path: str, config: Config,
+                  output_path: Optional[str] = None, store_path: Optional[str] = None,
+                  doc_fingerprint: Optional[str] = None) -> None:
+    """Run OCR over a stream of page images and collect per-page results.
     
     Args:
-        pdf_path: Path to the PDF file
+        pages: Iterable of page images, consumed lazily
+        source_path: Path of the document the pages come from
         config: Configuration object
         output_path: Optional path to save results
+        store_path: Optional path of a SQLite result store to write results to
+        doc_fingerprint: Document fingerprint for the store; defaults to the
+            fingerprint of source_path
     """
-    # Initialize processors
-    pdf_processor = PDFProcessor(config)
     ocr_engine = OCREngine(config)
     
     results = []
     
     try:
-        # Process each page
-        for page_num, image in enumerate(pdf_processor.pdf_to_images(pdf_path), 1):
-            logging.info(f"Processing page {page_num}")
-            
-            try:
-                extracted_text = ocr_engine.extract_text(image)
-                
-                result = {
-                    'page': page_num,
-                    'text': extracted_text,
-                    'status': 'success'
-                }
-                
-                print(f"\n--- Page {page_num} ---")
-                print(extracted_text)
-                print(f"--- End Page {page_num} ---\n")
-                
-            except Exception as e:
-                logging.error(f"Failed to process page {page_num}: {e}")
-                result = {
-                    'page': page_num,
-                    'text': '',
-                    'status': 'error',
-                    'error': str(e)
-                }
+        # With a document budget, the page count lets pages past the
+        # deadline be skipped without rendering them
+        page_count = None
+        if config.document_time_budget is not None:
+            page_count = document_page_count(source_path, config)
+        
+        # Process each page; preprocessing of later pages runs ahead
+        for result in extract_document(ocr_engine, pages, config, page_count):
+            if result['status'] == 'success':
+                print(f"\n--- Page {result['page']} ---")
+                print(result['text'])
+                print(f"--- End Page {result['page']} ---\n")
             
             results.append(result)
     
     except Exception as e:
-        logging.error(f"Failed to process PDF: {e}")
+        logging.error(f"Failed to process {source_path}: {e}")
         sys.exit(1)
+    finally:
+        ocr_engine.close()
     
     # Save results if output path is provided
     if output_path:
         save_results(results, output_path)
+    
+    if store_path:
+        with ResultStore(store_path) as store:
+            store.add_results(doc_fingerprint or file_fingerprint(source_path),
+                              config.fingerprint(), results, path=source_path)
+        logging.info(f"Results stored in {store_path}")
 
 
-def process_image(image_path: str, config: Config) -> None:
-    """Process a single image file.
+def process_pdf(pdf_path: str, config: Config, output_path: Optional[str] = None,
+                store_path: Optional[str] = None) -> None:
+    """Process a PDF file and extract information.
     
     Args:
-        image_path: Path to the image file
+        pdf_path: Path to the PDF file
         config: Configuration object
+        output_path: Optional path to save results
+        store_path: Optional path of a SQLite result store to write results to
     """
-    ocr_engine = OCREngine(config)
+    process_pages(iter_document_pages(pdf_path, config), pdf_path, config,
+                  output_path, store_path)
+
+
+def process_image(image_path: str, config: Config, output_path: Optional[str] = None,
+                  store_path: Optional[str] = None) -> None:
+    """Process an image file, or a directory holding an image sequence.
     
-    try:
-        extracted_text = ocr_engine.extract_text(image_path)
-        print(f"\n--- Extracted Text ---")
-        print(extracted_text)
-        print(f"--- End ---\n")
-        
-    except Exception as e:
-        logging.error(f"Failed to process image: {e}")
+    Every frame of a multi-frame image (e.g. a fax TIFF) and every file of a
+    sequence becomes one page. Frames are decoded one at a time.
+    
+    Args:
+        image_path: Path to the image file or image sequence directory
+        config: Configuration object
+        output_path: Optional path to save results
+        store_path: Optional path of a SQLite result store to write results to
+    """
+    image_processor = ImageProcessor(config)
+    
+    if Path(image_path).is_dir():
+        image_files = image_processor.list_image_files(image_path)
+        if not image_files:
+            logging.error(f"No supported image files in {image_path}")
+            sys.exit(1)
+        pages = image_processor.sequence_to_frames(image_files)
+        doc_fingerprint = sequence_fingerprint(image_files) if store_path else None
+    else:
+        pages = image_processor.image_to_frames(image_path)
+        doc_fingerprint = None
+    
+    process_pages(pages, image_path, config, output_path, store_path, doc_fingerprint)
+
+
+def store_main(argv: List[str]) -> None:
+    """Query a SQLite result store (``main.py store ...``).
+    
+    Args:
+        argv: Command-line arguments following ``store``
+    """
+    parser = argparse.ArgumentParser(
+        prog="main.py store",
+        description="Query a result store written with --store"
+    )
+    parser.add_argument("db", help="Path to the result store database")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    search_parser = subparsers.add_parser("search", help="Full-text search over page text")
+    search_parser.add_argument("query", help="FTS5 query, e.g. 'invoice AND total'")
+    search_parser.add_argument("--limit", type=int, default=20, help="Maximum number of hits")
+    search_parser.add_argument("--phrase", action="store_true",
+                               help="Search for the query as a literal phrase")
+    
+    page_parser = subparsers.add_parser("page", help="Show one page of a document")
+    page_parser.add_argument("document", help="Document path or fingerprint")
+    page_parser.add_argument("page", type=int, help="1-based page number")
+    page_parser.add_argument("--config-fingerprint", help="Restrict to results of one config")
+    
+    doc_parser = subparsers.add_parser("doc", help="Show all pages of a document")
+    doc_parser.add_argument("document", help="Document path or fingerprint")
+    doc_parser.add_argument("--config-fingerprint", help="Restrict to results of one config")
+    
+    subparsers.add_parser("stats", help="Show document and page counts")
+    
+    args = parser.parse_args(argv)
+    
+    if not Path(args.db).exists():
+        logging.error(f"Result store not found: {args.db}")
+        sys.exit(1)
+    
+    with ResultStore(args.db) as store:
+        if args.command == "search":
+            query = args.query
+            if args.phrase:
+                query = '"' + query.replace('"', '""') + '"'
+            try:
+                output = store.search(query, limit=args.limit)
+            except sqlite3.OperationalError as e:
+                logging.error(f"Invalid search query {args.query!r}: {e} "
+                              f"(use --phrase to search for it literally)")
+                sys.exit(1)
+        elif args.command == "page":
+            output = store.get_page(store.resolve_document(args.document), args.page,
+                                    args.config_fingerprint)
+            if output is None:
+                logging.error(f"Page {args.page} of {args.document} not found")
+                sys.exit(1)
+        elif args.command == "doc":
+            output = store.get_document(store.resolve_document(args.document),
+                                        args.config_fingerprint)
+        else:
+            output = store.stats()
+    
+    print(json.dumps(output, indent=2, ensure_ascii=False))
+
+
+def bench_main(argv: List[str]) -> None:
+    """Run the performance benchmark suite (``main.py bench ...``).
+    
+    Args:
+        argv: Command-line arguments following ``bench``
+    """
+    parser = argparse.ArgumentParser(
+        prog="main.py bench",
+        description="Time render, resize, preprocess and generate stages on synthetic PDFs"
+    )
+    parser.add_argument("-c", "--config", help="Path to configuration file")
+    parser.add_argument("-o", "--output", help="Write the report as a JSON baseline to this path")
+    parser.add_argument("-b", "--baseline", help="Compare against this JSON baseline")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2,
+        help="Allowed relative slowdown before a stage counts as regressed (default: 0.2)"
+    )
+    parser.add_argument(
+        "--stage-threshold", action="append", default=[], metavar="STAGE=VALUE",
+        help="Per-stage threshold override, e.g. generate=0.5 or render/huge_page=0.3"
+    )
+    parser.add_argument("--real-model", action="store_true",
+                        help="Benchmark the configured model instead of the fake one")
+    parser.add_argument("--cases", nargs="+", choices=bench.CASES, help="Cases to run")
+    parser.add_argument("--pages", type=int, default=3, help="Pages per synthetic document")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per measurement")
+    args = parser.parse_args(argv)
+    
+    stage_thresholds = {}
+    for item in args.stage_threshold:
+        stage, _, value = item.partition("=")
+        try:
+            stage_thresholds[stage] = float(value)
+        except ValueError:
+            parser.error(f"Invalid --stage-threshold {item!r}, expected STAGE=VALUE")
+    
+    config = load_config(args.config)
+    report = bench.run_benchmarks(config, use_real_model=args.real_model, pages=args.pages,
+                                  repeat=args.repeat, cases=args.cases)
+    
+    print(f"{'stage':<28}{'ms/page':>12}")
+    for stage, timing in report['stages'].items():
+        print(f"{stage:<28}{timing['ms_per_page']:>12.2f}")
+    
+    if args.output:
+        bench.save_baseline(report, args.output)
+    
+    if args.baseline:
+        comparisons = bench.compare_to_baseline(report, bench.load_baseline(args.baseline),
+                                                args.threshold, stage_thresholds)
+        print(f"\n{'stage':<28}{'baseline':>12}{'current':>12}{'change':>10}")
+        for c in comparisons:
+            flag = "  REGRESSED" if c['regressed'] else ""
+            print(f"{c['stage']:<28}{c['baseline_ms']:>12.2f}{c['current_ms']:>12.2f}"
+                  f"{c['change']:>+10.1%}{flag}")
+        regressions = [c for c in comparisons if c['regressed']]
+        if regressions:
+            logging.error(f"{len(regressions)} stage(s) regressed beyond their threshold")
+            sys.exit(1)
+
+
+def batch_main(argv: List[str]) -> None:
+    """Extract many documents in one long run (``main.py batch ...``).
+    
+    Args:
+        argv: Command-line arguments following ``batch``
+    """
+    parser = argparse.ArgumentParser(
+        prog="main.py batch",
+        description="Process many documents with memory release and worker recycling"
+    )
+    parser.add_argument("inputs", nargs="*", help="PDF/image files or image directories")
+    parser.add_argument("-m", "--manifest", help="Text file with one input path per line")
+    parser.add_argument("-o", "--output-dir", help="Directory for per-document JSON results")
+    parser.add_argument("-s", "--store", help="Path of a SQLite result store to add results to")
+    parser.add_argument("-c", "--config", help="Path to configuration file")
+    parser.add_argument("--recycle-pages", type=int,
+                        help="Replace the worker process after this many pages")
+    parser.add_argument("--recycle-rss-mb", type=float,
+                        help="Replace the worker process after this much RSS growth (MB)")
+    parser.add_argument("--release-interval", type=int,
+                        help="Release cached memory every N pages")
+    parser.add_argument("--in-process", action="store_true",
+                        help="Run in this process (no worker recycling)")
+    parser.add_argument("--schedule", action="store_true",
+                        help="Batch pages of similar expected length across documents "
+                             "(in this process)")
+    parser.add_argument("--log-level", choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+                        default='INFO', help="Set the logging level")
+    args = parser.parse_args(argv)
+    
+    logging.getLogger().setLevel(args.log_level)
+    
+    paths = list(args.inputs)
+    if args.manifest:
+        paths.extend(read_manifest(args.manifest))
+    if not paths:
+        parser.error("no inputs given")
+    
+    missing = [path for path in paths if not Path(path).exists()]
+    for path in missing:
+        logging.error(f"Input file not found: {path}")
+    paths = [path for path in paths if Path(path).exists()]
+    
+    config = load_config(args.config)
+    overrides = {
+        'worker_recycle_pages': args.recycle_pages,
+        'worker_recycle_rss_mb': args.recycle_rss_mb,
+        'memory_release_interval': args.release_interval,
+    }
+    config = Config.from_dict({
+        **config.to_dict(),
+        'release_page_images': True,
+        **{key: value for key, value in overrides.items() if value is not None},
+    })
+    
+    if args.schedule:
+        summary = run_scheduled(paths, config, args.output_dir, args.store)
+        records = summary['documents']
+        stats = summary['stats']
+        print(f"{stats['pages']} pages in {stats['batches']} batches: "
+              f"{stats['tokens_per_second']} tokens/s, "
+              f"padding efficiency {stats['padding_efficiency']:.0%}")
+    else:
+        try:
+            records = run_batch(paths, config, args.output_dir, args.store,
+                                use_subprocess=not args.in_process)
+        except RuntimeError as e:
+            logging.error(f"Batch aborted: {e}")
+            sys.exit(1)
+    
+    failed = [r for r in records if r['status'] != 'success']
+    print(f"Processed {len(records)} documents, {len(failed) + len(missing)} failed")
+    leaks = sorted(records, key=lambda r: r.get('rss_delta_mb', 0), reverse=True)[:5]
+    for record in leaks:
+        if record.get('rss_delta_mb', 0) > 0:
+            print(f"  {record['rss_delta_mb']:+8.1f} MB  {record['path']}")
+    if failed or missing:
         sys.exit(1)
 
 
+def job_main(argv: List[str]) -> None:
+    """Run a sharded job over a shared work queue (``main.py job ...``).
+    
+    Args:
+        argv: Command-line arguments following ``job``
+    """
+    parser = argparse.ArgumentParser(
+        prog="main.py job",
+        description="Distribute pages across workers through a queue on a shared filesystem"
+    )
+    parser.add_argument("queue", help="Path to the job queue database")
+    parser.add_argument("-c", "--config", help="Path to configuration file")
+    parser.add_argument("--log-level", choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+                        default='INFO', help="Set the logging level")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    init_parser = subparsers.add_parser("init", help="Queue the pages of documents")
+    init_parser.add_argument("inputs", nargs="*", help="PDF/image files or image directories")
+    init_parser.add_argument("-m", "--manifest", help="Text file with one input path per line")
+    
+    work_parser = subparsers.add_parser("work", help="Process pages until the queue is finished")
+    work_parser.add_argument("-s", "--store", help="Path of a SQLite result store to add results to")
+    work_parser.add_argument("--worker-id", help="Worker id (default: host:pid)")
+    work_parser.add_argument("--max-items", type=int, help="Stop after this many pages")
+    work_parser.add_argument("--poll-interval", type=float, default=5.0,
+                             help="Seconds between claims while other workers hold leases")
+    
+    subparsers.add_parser("status", help="Show item counts per status")
+    
+    export_parser = subparsers.add_parser("export", help="Write per-document results as JSON")
+    export_parser.add_argument("output_dir", help="Directory for per-document JSON results")
+    
+    args = parser.parse_args(argv)
+    
+    logging.getLogger().setLevel(args.log_level)
+    config = load_config(args.config)
+    
+    if args.command == "work":
+        run_worker(args.queue, config, worker_id=args.worker_id, store_path=args.store,
+                   max_items=args.max_items, poll_interval=args.poll_interval)
+        return
+    
+    with JobQueue(args.queue, lease_seconds=config.job_lease_seconds,
+                  max_attempts=config.job_max_attempts) as job_queue:
+        if args.command == "init":
+            paths = list(args.inputs)
+            if args.manifest:
+                paths.extend(read_manifest(args.manifest))
+            missing = [path for path in paths if not Path(path).exists()]
+            for path in missing:
+                logging.error(f"Input file not found: {path}")
+            added = job_queue.add_documents(
+                [path for path in paths if Path(path).exists()], config
+            )
+            print(f"Queued {added} pages")
+            if missing:
+                sys.exit(1)
+        elif args.command == "status":
+            print(json.dumps(job_queue.counts(), indent=2))
+        else:
+            job_queue.export(args.output_dir)
+            print(json.dumps(job_queue.counts(), indent=2))
+
+
+COMMANDS = {
+    'store': store_main,
+    'bench': bench_main,
+    'batch': batch_main,
+    'job': job_main,
+}
+
+
 def main():
     """Main function for command-line interface."""
+    argv = sys.argv[1:]
+    if argv and argv[0] in COMMANDS:
+        setup_logging("WARNING")
+        COMMANDS[argv[0]](argv[1:])
+        return
+    
     parser = argparse.ArgumentParser(
         description="Extract information from PDF documents using OCR"
     )
     
     parser.add_argument(
         "input_file",
-        help="Path to PDF or image file to process"
+        help="Path to PDF or image file (multi-frame TIFFs included), or a directory of images"
     )
     
     parser.add_argument(
@@ -104,6 +420,11 @@ def main():
         help="Output path for results (JSON format)"
     )
     
+    parser.add_argument(
+        "-s", "--store",
+        help="Path of a SQLite result store to add results to (query with 'main.py store')"
+    )
+    
     parser.add_argument(
         "-c", "--config",
         help="Path to configuration file"
@@ -115,6 +436,12 @@ def main():
         help="Enable verbose logging"
     )
     
+    parser.add_argument(
+        "--hybrid",
+        action="store_true",
+        help="Use the PDF text layer and OCR only the image regions of mixed pages"
+    )
+    
     parser.add_argument(
         "--log-level",
         choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
@@ -130,6 +457,8 @@ def main():
     
     # Load configuration
     config = load_config(args.config)
+    if args.hybrid:
+        config = Config.from_dict({**config.to_dict(), 'hybrid_extraction': True})
     logging.info(f"Using configuration: {config.model_path}")
     
     # Validate input file
@@ -142,27 +471,31 @@ def main():
     # Process based on file type
     file_extension = Path(input_path).suffix.lower()
     
-    if file_extension == '.pdf':
+    if Path(input_path).is_dir():
+        logging.info(f"Processing image sequence: {input_path}")
+        process_image(input_path, config, args.output, args.store)
+        
+    elif file_extension == '.pdf':
         if not validate_file_path(input_path, ['.pdf']):
             logging.error(f"Invalid PDF file: {input_path}")
             sys.exit(1)
         
         logging.info(f"Processing PDF file: {input_path}")
-        process_pdf(input_path, config, args.output)
+        process_pdf(input_path, config, args.output, args.store)
         
-    elif file_extension in ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']:
-        if not validate_file_path(input_path, ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']):
+    elif file_extension in SUPPORTED_EXTENSIONS:
+        if not validate_file_path(input_path, SUPPORTED_EXTENSIONS):
             logging.error(f"Invalid image file: {input_path}")
             sys.exit(1)
         
         logging.info(f"Processing image file: {input_path}")
-        process_image(input_path, config)
+        process_image(input_path, config, args.output, args.store)
         
     else:
         logging.error(f"Unsupported file type: {file_extension}")
-        logging.info("Supported formats: PDF, JPG, JPEG, PNG, BMP, TIFF")
+        logging.info("Supported formats: PDF, JPG, JPEG, PNG, BMP, TIFF, GIF, WEBP, "
+                     "or a directory of images")
         sys.exit(1)
 
-
 if __name__ == "__main__":
     main()
\ No newline at end of file
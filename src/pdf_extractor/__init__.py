@@ -7,9 +7,11 @@ from PDF documents using advanced OCR models.
 
 from .ocr_engine import OCREngine
 from .pdf_processor import PDFProcessor
+from .image_processor import ImageProcessor
 from .config import Config
+from .result_store import ResultStore
 
 __version__ = "1.0.0"
 __author__ = "paopaoxiangg"
 
-__all__ = ['OCREngine', 'PDFProcessor', 'Config']
+__all__ = ['OCREngine', 'PDFProcessor', 'ImageProcessor', 'Config', 'ResultStore']
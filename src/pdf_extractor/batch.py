@@ -0,0 +1,187 @@
+"""Long-running batch extraction with worker recycling."""
+
+import json
+import logging
+import multiprocessing
+import os
+import queue
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Type
+
+from .config import Config
+from .memory import MemoryTracker, release_memory
+from .ocr_engine import OCREngine
+from .pipeline import document_page_count, extract_document, iter_document_pages
+from .result_store import ResultStore
+from .utils import document_fingerprint, output_file_path, save_results, setup_logging
+
+logger = logging.getLogger(__name__)
+
+_READY = 'ready'
+_DONE = 'done'
+_RECYCLE = 'recycle'
+
+
+def _batch_worker(paths: List[str], start: int, config_dict: Dict[str, Any],
+                  output_dir: Optional[str], store_path: Optional[str],
+                  events: multiprocessing.Queue, log_level: Optional[str] = None,
+                  engine_cls: Type[OCREngine] = OCREngine, recycle: bool = True) -> None:
+    """Process documents from paths[start:] until a recycle limit is hit.
+    
+    Reports a ready event once the engine is loaded, one event per document
+    to ``events``, then a final event telling the parent whether the list is
+    done or a fresh worker is needed. With ``recycle`` False (in-process
+    runs) the recycle limits are not checked and all documents run.
+    """
+    if log_level:
+        setup_logging(log_level)
+    config = Config.from_dict(config_dict)
+    ocr_engine = engine_cls(config)
+    tracker = MemoryTracker()
+    store = ResultStore(store_path) if store_path else None
+    pages_done = 0
+    events.put((_READY, start))
+    
+    try:
+        for index in range(start, len(paths)):
+            path = paths[index]
+            tracker.start()
+            record: Dict[str, Any] = {'index': index, 'path': path, 'worker_pid': os.getpid()}
+            try:
+                page_count = None
+                if config.document_time_budget is not None:
+                    page_count = document_page_count(path, config)
+                results = list(extract_document(ocr_engine, iter_document_pages(path, config),
+                                                config, page_count))
+                if output_dir:
+                    save_results(results, output_file_path(output_dir, index, path))
+                if store is not None:
+                    store.add_results(document_fingerprint(path), config.fingerprint(),
+                                      results, path=path)
+                record.update(
+                    status='success',
+                    pages=len(results),
+                    failed_pages=sum(r['status'] != 'success' for r in results),
+                )
+                pages_done += len(results)
+            except Exception as e:
+                logger.error(f"Failed to process {path}: {e}")
+                record.update(status='error', error=str(e), pages=0)
+            
+            release_memory()
+            record.update(tracker.stop())
+            events.put(record)
+            
+            if not recycle:
+                continue
+            growth = tracker.growth_mb
+            if (config.worker_recycle_pages and pages_done >= config.worker_recycle_pages) or \
+                    (config.worker_recycle_rss_mb and growth >= config.worker_recycle_rss_mb):
+                if index + 1 < len(paths):
+                    logger.info(
+                        f"Recycling worker {os.getpid()} after {pages_done} pages "
+                        f"(RSS growth {growth:.0f} MB)"
+                    )
+                    events.put((_RECYCLE, index + 1))
+                    return
+        events.put((_DONE, len(paths)))
+    finally:
+        if store is not None:
+            store.close()
+        ocr_engine.close()
+
+
+def run_batch(paths: List[str], config: Config, output_dir: Optional[str] = None,
+              store_path: Optional[str] = None, use_subprocess: bool = True,
+              engine_cls: Type[OCREngine] = OCREngine) -> List[Dict[str, Any]]:
+    """Extract a list of documents in one long run.
+    
+    Documents run in a worker process that is replaced by a fresh one after
+    ``config.worker_recycle_pages`` pages or ``config.worker_recycle_rss_mb``
+    MB of RSS growth, so leaks and fragmentation cannot accumulate. Memory is
+    released after every document and every ``config.memory_release_interval``
+    pages.
+    
+    Args:
+        paths: Document paths (PDFs, images, or image sequence directories)
+        config: Configuration object
+        output_dir: Optional directory for one JSON result file per document
+        store_path: Optional path of a SQLite result store to write results to
+        use_subprocess: Run workers in child processes; if False, documents
+            run in this process and are never recycled
+        engine_cls: OCREngine class to instantiate in the workers
+            
+    Returns:
+        One record per document with 'path', 'status', 'pages', the worker
+        pid, and 'rss_before_mb', 'rss_after_mb', 'rss_delta_mb'
+        
+    Raises:
+        RuntimeError: If a worker exits before it is ready, e.g. because the
+            model cannot be loaded; every replacement would fail the same way
+    """
+    if output_dir:
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+    
+    ctx = multiprocessing.get_context("spawn") if use_subprocess else None
+    events = ctx.Queue() if ctx else queue.Queue()
+    records: List[Dict[str, Any]] = []
+    start = 0
+    
+    while start < len(paths):
+        if ctx is None:
+            worker = None
+            _batch_worker(paths, start, config.to_dict(), output_dir, store_path, events,
+                          engine_cls=engine_cls, recycle=False)
+        else:
+            log_level = logging.getLevelName(logging.getLogger().getEffectiveLevel())
+            worker = ctx.Process(
+                target=_batch_worker,
+                args=(paths, start, config.to_dict(), output_dir, store_path, events, log_level,
+                      engine_cls),
+                name=f"batch-worker-{start}",
+            )
+            worker.start()
+        
+        next_start = None
+        ready = False
+        while next_start is None:
+            try:
+                event = events.get(timeout=1.0)
+            except queue.Empty:
+                if worker is not None and not worker.is_alive():
+                    if not ready:
+                        raise RuntimeError(
+                            f"Batch worker exited with code {worker.exitcode} before it "
+                            f"was ready; not restarting it"
+                        )
+                    # The worker died mid-document; record it and move on.
+                    failed = start + sum(r['index'] >= start for r in records)
+                    logger.error(f"Worker exited with code {worker.exitcode} on {paths[failed]}")
+                    records.append({
+                        'index': failed, 'path': paths[failed], 'status': 'error',
+                        'error': f"worker exited with code {worker.exitcode}", 'pages': 0,
+                    })
+                    next_start = failed + 1
+                continue
+            
+            if isinstance(event, tuple):
+                if event[0] == _READY:
+                    ready = True
+                else:
+                    next_start = event[1]
+            else:
+                records.append(event)
+                logger.info(
+                    f"[{event['index'] + 1}/{len(paths)}] {event['path']}: {event['status']}, "
+                    f"RSS {event['rss_after_mb']:.0f} MB ({event['rss_delta_mb']:+.1f} MB)"
+                )
+        
+        if worker is not None:
+            worker.join()
+        start = next_start
+    
+    records.sort(key=lambda r: r['index'])
+    if output_dir:
+        with open(Path(output_dir) / "batch_summary.json", 'w', encoding='utf-8') as f:
+            json.dump(records, f, indent=2)
+    return records
@@ -0,0 +1,432 @@
+"""Performance benchmarks for the extraction pipeline.
+
+Generates synthetic PDFs with PyMuPDF, times each pipeline stage (render,
+resize, preprocess, generate) with a fake or the real model, and compares
+the timings against a stored JSON baseline.
+"""
+
+import io
+import json
+import logging
+import platform
+import statistics
+import tempfile
+import time
+import zlib
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+import fitz  # PyMuPDF
+import numpy as np
+import torch
+from PIL import Image, ImageDraw
+
+from .config import Config
+from .ocr_engine import OCREngine
+from .pdf_processor import PDFProcessor
+
+logger = logging.getLogger(__name__)
+
+BASELINE_VERSION = 1
+
+CASES = ['text_only', 'scanned_image', 'mixed', 'huge_page']
+
+_LOREM = (
+    "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod "
+    "tempor incididunt ut labore et dolore magna aliqua. Ut enim ad minim veniam, "
+    "quis nostrud exercitation ullamco laboris nisi ut aliquip ex ea commodo consequat."
+)
+
+
+def _scan_image(width: int, height: int, seed: int) -> bytes:
+    """Render a noisy grayscale 'scan' with text lines as JPEG bytes."""
+    rng = np.random.default_rng(seed)
+    noise = rng.normal(235, 12, (height, width)).clip(0, 255).astype(np.uint8)
+    img = Image.fromarray(noise)
+    draw = ImageDraw.Draw(img)
+    for y in range(height // 20, height - height // 20, max(12, height // 60)):
+        draw.text((width // 12, y), _LOREM[:90], fill=20)
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=85)
+    return buf.getvalue()
+
+
+def _add_text(page, rect, lines: int) -> None:
+    """Fill a rectangle of a page with lines of text."""
+    y = rect.y0 + 14
+    for i in range(lines):
+        if y > rect.y1 - 4:
+            break
+        page.insert_text((rect.x0, y), f"{i + 1:03d} {_LOREM[:80]}", fontsize=9)
+        y += 12
+
+
+def generate_synthetic_pdfs(output_dir: str, pages: int = 3) -> Dict[str, str]:
+    """Write one synthetic PDF per benchmark case.
+    
+    Args:
+        output_dir: Directory to write the PDFs to
+        pages: Pages per document (the huge-page case always has one page)
+        
+    Returns:
+        Mapping of case name to PDF path
+    """
+    out = Path(output_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    paths = {}
+    
+    # Digital text only
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page(width=612, height=792)
+        _add_text(page, fitz.Rect(54, 54, 558, 738), lines=55)
+    paths['text_only'] = str(out / 'text_only.pdf')
+    doc.save(paths['text_only'])
+    doc.close()
+    
+    # One full-page 300 DPI scan per page
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page(width=612, height=792)
+        page.insert_image(page.rect, stream=_scan_image(2550, 3300, seed=i))
+    paths['scanned_image'] = str(out / 'scanned_image.pdf')
+    doc.save(paths['scanned_image'])
+    doc.close()
+    
+    # Text layer plus an embedded figure
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page(width=612, height=792)
+        _add_text(page, fitz.Rect(54, 54, 558, 380), lines=25)
+        page.insert_image(fitz.Rect(108, 400, 504, 700), stream=_scan_image(1200, 900, seed=100 + i))
+        _add_text(page, fitz.Rect(54, 710, 558, 760), lines=3)
+    paths['mixed'] = str(out / 'mixed.pdf')
+    doc.save(paths['mixed'])
+    doc.close()
+    
+    # A single oversized page (A2) with dense text
+    doc = fitz.open()
+    page = doc.new_page(width=1191, height=1684)
+    for col in range(2):
+        x0 = 40 + col * 570
+        _add_text(page, fitz.Rect(x0, 40, x0 + 550, 1644), lines=135)
+    paths['huge_page'] = str(out / 'huge_page.pdf')
+    doc.save(paths['huge_page'])
+    doc.close()
+    
+    return paths
+
+
+class _FakeTokenizer:
+    """Tokenizer stand-in exposing only what OCREngine uses."""
+    
+    eos_token_id = 0
+    image_token = "<image>"
+    image_token_id = 1
+    
+    def __call__(self, text):
+        return {'input_ids': [
+            self.image_token_id if word == self.image_token else 2 + zlib.crc32(word.encode()) % 1000
+            for word in text.split()
+        ]}
+
+
+class _FakeProcessor:
+    """Processor stand-in doing comparable host-side work to the real one.
+    
+    Images are normalized and cut into 14x14 patches, as the Qwen2-VL style
+    image processor does, so the preprocess stage stays meaningful.
+    """
+    
+    patch_size = 14
+    
+    def __init__(self):
+        self.tokenizer = _FakeTokenizer()
+    
+    def apply_chat_template(self, messages, tokenize=False, add_generation_prompt=True):
+        return f"system {self.tokenizer.image_token} {messages[-1]['content'][-1]['text']} assistant"
+    
+    def __call__(self, text, images, padding=True, padding_side="right", return_tensors="pt"):
+        from transformers import BatchFeature
+        
+        p = self.patch_size
+        all_patches, all_ids = [], []
+        for prompt, image in zip(text, images):
+            pixels = torch.from_numpy(np.asarray(image, dtype=np.float32)) / 255.0
+            pixels = (pixels - 0.5) / 0.5
+            h, w = (pixels.shape[0] // p) * p, (pixels.shape[1] // p) * p
+            patches = (pixels[:h, :w]
+                       .reshape(h // p, p, w // p, p, 3)
+                       .permute(0, 2, 1, 3, 4)
+                       .reshape(-1, p * p * 3))
+            all_patches.append(patches)
+            # One image token per 2x2 patch group, plus the prompt
+            ids = []
+            for token in self.tokenizer(prompt)['input_ids']:
+                ids.extend([token] * (patches.shape[0] // 4)
+                           if token == self.tokenizer.image_token_id else [token])
+            all_ids.append(ids)
+        
+        n_tokens = max(len(ids) for ids in all_ids)
+        input_ids = torch.zeros((len(all_ids), n_tokens), dtype=torch.long)
+        attention_mask = torch.zeros((len(all_ids), n_tokens), dtype=torch.long)
+        for row, ids in enumerate(all_ids):
+            start = n_tokens - len(ids) if padding_side == "left" else 0
+            input_ids[row, start:start + len(ids)] = torch.tensor(ids)
+            attention_mask[row, start:start + len(ids)] = 1
+        return BatchFeature({
+            'input_ids': input_ids,
+            'attention_mask': attention_mask,
+            'pixel_values': torch.cat(all_patches),
+        })
+    
+    def batch_decode(self, sequences, skip_special_tokens=True, clean_up_tokenization_spaces=True):
+        return [" ".join(str(int(t)) for t in row[:32]) for row in sequences]
+
+
+class _FakeModel:
+    """Model stand-in whose decode step costs a small fixed matmul per token.
+    
+    The generated tokens depend on the input ids, and calls that receive
+    pixel values are counted in ``vision_encodes``.
+    """
+    
+    def __init__(self, hidden_size: int = 512):
+        self.device = torch.device("cpu")
+        generator = torch.Generator().manual_seed(0)
+        self.weight = torch.randn(hidden_size, hidden_size, generator=generator) / hidden_size ** 0.5
+        self.vision_encodes = 0
+    
+    def eval(self):
+        return self
+    
+    def __call__(self, input_ids, attention_mask=None, pixel_values=None, use_cache=True, **kwargs):
+        if pixel_values is not None:
+            self.vision_encodes += 1
+        return SimpleNamespace(past_key_values=[input_ids.shape[1]])
+    
+    def generate(self, input_ids, attention_mask=None, pixel_values=None, max_new_tokens=16,
+                 **kwargs):
+        if pixel_values is not None:
+            self.vision_encodes += 1
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+        seed = ((input_ids * attention_mask).sum(dim=1, keepdim=True) % 97 + 1) / 97
+        state = torch.ones(input_ids.shape[0], self.weight.shape[0]) * seed
+        tokens = []
+        for _ in range(max_new_tokens):
+            state = torch.tanh(state @ self.weight)
+            tokens.append(state.argmax(dim=1) + 1)
+        generated = torch.stack(tokens, dim=1)
+        return torch.cat([input_ids, generated], dim=1)
+
+
+class FakeOCREngine(OCREngine):
+    """OCREngine with a fake model, for benchmarking pipeline overhead."""
+    
+    def _load_model(self):
+        self.processor = _FakeProcessor()
+        self.tokenizer = self.processor.tokenizer
+        self.model = _FakeModel()
+
+
+class RandomModelEngine(OCREngine):
+    """OCREngine around a small randomly initialized Qwen2.5-VL.
+    
+    Runs the engine's real generation path (including compiled static-cache
+    generation on CUDA) without downloading weights. It has no processor,
+    so generation starts from prompt token ids (see prompt_inputs).
+    """
+    
+    def _load_model(self):
+        from transformers import Qwen2_5_VLConfig, Qwen2_5_VLForConditionalGeneration
+        
+        model_config = Qwen2_5_VLConfig(
+            text_config={
+                'vocab_size': 4096, 'hidden_size': 256, 'intermediate_size': 1024,
+                'num_hidden_layers': 6, 'num_attention_heads': 8, 'num_key_value_heads': 2,
+                'max_position_embeddings': 4096,
+                'rope_scaling': {'type': 'mrope', 'mrope_section': [4, 6, 6]},
+                'bos_token_id': 0, 'eos_token_id': 1,
+            },
+            vision_config={'depth': 1, 'hidden_size': 32, 'intermediate_size': 64,
+                           'num_heads': 2, 'out_hidden_size': 256},
+        )
+        torch.manual_seed(0)
+        device = "cuda" if torch.cuda.is_available() and self.config.device_map != "cpu" else "cpu"
+        self.processor = None
+        self.tokenizer = SimpleNamespace(eos_token_id=1)
+        self.model = Qwen2_5_VLForConditionalGeneration(model_config).to(device).eval()
+        if self.config.compile_generation:
+            self._setup_compiled_generation()
+    
+    def prompt_inputs(self, prompt_tokens: int, seed: int = 0):
+        """Random prompt token ids of the given length, on the model device."""
+        from transformers import BatchFeature
+        
+        generator = torch.Generator().manual_seed(seed)
+        input_ids = torch.randint(2, 4096, (1, prompt_tokens), generator=generator)
+        return self._to_device(BatchFeature({'input_ids': input_ids,
+                                             'attention_mask': torch.ones_like(input_ids)}))
+
+
+def _time(fn: Callable[[], Any], repeat: int) -> float:
+    """Median wall time of fn over repeat runs, in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def run_benchmarks(config: Optional[Config] = None, use_real_model: bool = False,
+                   pages: int = 3, repeat: int = 3,
+                   cases: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Time every pipeline stage on every synthetic case.
+    
+    Args:
+        config: Configuration object. If None, uses default config.
+        use_real_model: Benchmark the configured model instead of the fake one
+        pages: Pages per synthetic document
+        repeat: Timed runs per measurement (the median is reported)
+        cases: Subset of CASES to run; all if None
+        
+    Returns:
+        Benchmark report with per-stage milliseconds per page, keyed
+        '<stage>/<case>'
+    """
+    config = config or Config()
+    if not use_real_model:
+        # Keep fake generation short; the real model uses the config value.
+        config = Config.from_dict({**config.to_dict(), 'max_new_tokens': 64})
+    
+    engine = OCREngine(config) if use_real_model else FakeOCREngine(config)
+    processor = PDFProcessor(config)
+    stages: Dict[str, Dict[str, Any]] = {}
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        pdfs = generate_synthetic_pdfs(tmpdir, pages=pages)
+        for case in cases or CASES:
+            pdf_path = pdfs[case]
+            
+            images = list(processor.pdf_to_images(pdf_path))
+            n = len(images)
+            render_ms = _time(lambda: list(processor.pdf_to_images(pdf_path)), repeat)
+            stages[f"render/{case}"] = {
+                'ms_per_page': round(render_ms / n, 3),
+                'pages': n,
+                'fast_path_pages': processor.stats['fast_path_pages'],
+            }
+            
+            resize_ms = _time(lambda: [engine.load_and_resize_image(img) for img in images], repeat)
+            stages[f"resize/{case}"] = {'ms_per_page': round(resize_ms / n, 3), 'pages': n}
+            
+            resized = [engine.load_and_resize_image(img) for img in images]
+            preprocess_ms = _time(
+                lambda: [engine._preprocess(engine._bucket_image(img), config.ocr_prompt)
+                         for img in resized],
+                repeat
+            )
+            stages[f"preprocess/{case}"] = {'ms_per_page': round(preprocess_ms / n, 3), 'pages': n}
+            
+            # Generation is the slow stage with a real model: time one page.
+            inputs = engine._prepare_inputs(engine._bucket_image(resized[0]), config.ocr_prompt)
+            new_tokens = []
+            
+            def generate():
+                output = engine._generate(inputs)
+                new_tokens.append(output.shape[1] - inputs.input_ids.shape[1])
+            
+            generate_ms = _time(generate, 1 if use_real_model else repeat)
+            tokens = max(1, new_tokens[-1])
+            stages[f"generate/{case}"] = {
+                'ms_per_page': round(generate_ms, 3),
+                'ms_per_token': round(generate_ms / tokens, 3),
+                'new_tokens': tokens,
+                'pages': 1,
+            }
+            logger.info(f"Benchmarked {case}")
+    
+    engine.close()
+    return {
+        'version': BASELINE_VERSION,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'model': config.model_path if use_real_model else 'fake',
+        'platform': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'torch': torch.__version__,
+            'threads': torch.get_num_threads(),
+        },
+        'config_fingerprint': config.fingerprint(),
+        'stages': stages,
+    }
+
+
+def save_baseline(report: Dict[str, Any], path: str) -> None:
+    """Write a benchmark report as a JSON baseline.
+    
+    Args:
+        report: Report from run_benchmarks
+        path: Output JSON path
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Benchmark baseline saved to {path}")
+
+
+def load_baseline(path: str) -> Dict[str, Any]:
+    """Load a benchmark baseline written by save_baseline.
+    
+    Args:
+        path: Baseline JSON path
+        
+    Returns:
+        Benchmark report
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare_to_baseline(report: Dict[str, Any], baseline: Dict[str, Any],
+                        threshold: float = 0.2,
+                        stage_thresholds: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+    """Compare a report to a baseline, stage by stage.
+    
+    Args:
+        report: Current report from run_benchmarks
+        baseline: Baseline report
+        threshold: Allowed relative slowdown (0.2 = 20% slower)
+        stage_thresholds: Per-stage overrides, keyed by stage ('render') or
+            stage/case ('render/huge_page'); the most specific key wins
+            
+    Returns:
+        One comparison entry per stage present in both reports, with
+        'stage', 'baseline_ms', 'current_ms', 'change' (relative),
+        'threshold' and 'regressed'
+    """
+    if baseline.get('model') != report.get('model'):
+        logger.warning(
+            f"Baseline model {baseline.get('model')!r} differs from current {report.get('model')!r}"
+        )
+    
+    stage_thresholds = stage_thresholds or {}
+    comparisons = []
+    for key, current in report['stages'].items():
+        base = baseline.get('stages', {}).get(key)
+        if base is None or not base.get('ms_per_page'):
+            continue
+        allowed = stage_thresholds.get(key, stage_thresholds.get(key.split('/')[0], threshold))
+        change = current['ms_per_page'] / base['ms_per_page'] - 1
+        comparisons.append({
+            'stage': key,
+            'baseline_ms': base['ms_per_page'],
+            'current_ms': current['ms_per_page'],
+            'change': round(change, 4),
+            'threshold': allowed,
+            'regressed': change > allowed,
+        })
+    return comparisons
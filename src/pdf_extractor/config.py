@@ -1,7 +1,20 @@
 """Configuration settings for PDF extraction."""
 
-from dataclasses import dataclass
-from typing import Dict, Any
+import hashlib
+import json
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional
+
+# Settings that affect how fast results are produced but not their content;
+# they are left out of the config fingerprint.
+RUNTIME_FIELDS = frozenset({
+    'device_map', 'local_files_only', 'low_cpu_mem_usage', 'use_safetensors',
+    'compile_warmup', 'inference_concurrency',
+    'preprocess_workers', 'preprocess_prefetch', 'memory_release_interval',
+    'release_page_images', 'worker_recycle_pages', 'worker_recycle_rss_mb',
+    'job_lease_seconds', 'job_max_attempts', 'job_claim_batch', 'batch_size',
+    'schedule_window',
+})
 
 
 @dataclass
@@ -12,15 +25,56 @@ class Config:
     model_path: str = "nanonets/Nanonets-OCR-s"
     device_map: str = "auto"
     torch_dtype: str = "auto"
+    model_revision: Optional[str] = None
+    local_files_only: bool = False
+    low_cpu_mem_usage: bool = True
+    use_safetensors: bool = True
     
     # Image processing settings
     max_image_side: int = 2560
     dpi: int = 300
+    extract_embedded_images: bool = True
+    
+    # Hybrid extraction (native text layer + OCR of image regions)
+    hybrid_extraction: bool = False
+    hybrid_min_text_chars: int = 50
+    hybrid_min_region_area: float = 0.01
+    hybrid_max_region_coverage: float = 0.5
     
     # Generation settings
     max_new_tokens: int = 1536
     do_sample: bool = False
     temperature: float = 0.0
+    batch_size: int = 4
+    schedule_window: int = 32
+    
+    # Compiled generation (static KV cache + torch.compile'd decode step)
+    compile_generation: bool = False
+    compile_warmup: bool = True
+    image_size_buckets: List[int] = field(default_factory=lambda: [1024, 1536, 2048, 2560])
+    
+    # Latency budgets (seconds, None for no limit)
+    page_time_budget: Optional[float] = None
+    document_time_budget: Optional[float] = None
+    budget_retry: bool = True
+    fallback_image_scale: float = 0.5
+    fallback_max_new_tokens: int = 512
+    
+    # Concurrency settings
+    inference_concurrency: int = 1
+    preprocess_workers: int = 2
+    preprocess_prefetch: int = 4
+    
+    # Long-run memory settings (0 disables)
+    memory_release_interval: int = 0
+    release_page_images: bool = False
+    worker_recycle_pages: int = 0
+    worker_recycle_rss_mb: float = 0
+    
+    # Distributed job settings
+    job_lease_seconds: float = 600
+    job_max_attempts: int = 3
+    job_claim_batch: int = 4
     
     # OCR prompt
     ocr_prompt: str = (
@@ -43,10 +97,45 @@ class Config:
             'model_path': self.model_path,
             'device_map': self.device_map,
             'torch_dtype': self.torch_dtype,
+            'model_revision': self.model_revision,
+            'local_files_only': self.local_files_only,
+            'low_cpu_mem_usage': self.low_cpu_mem_usage,
+            'use_safetensors': self.use_safetensors,
             'max_image_side': self.max_image_side,
             'dpi': self.dpi,
+            'extract_embedded_images': self.extract_embedded_images,
+            'hybrid_extraction': self.hybrid_extraction,
+            'hybrid_min_text_chars': self.hybrid_min_text_chars,
+            'hybrid_min_region_area': self.hybrid_min_region_area,
+            'hybrid_max_region_coverage': self.hybrid_max_region_coverage,
             'max_new_tokens': self.max_new_tokens,
             'do_sample': self.do_sample,
             'temperature': self.temperature,
+            'batch_size': self.batch_size,
+            'schedule_window': self.schedule_window,
+            'compile_generation': self.compile_generation,
+            'compile_warmup': self.compile_warmup,
+            'image_size_buckets': list(self.image_size_buckets),
+            'page_time_budget': self.page_time_budget,
+            'document_time_budget': self.document_time_budget,
+            'budget_retry': self.budget_retry,
+            'fallback_image_scale': self.fallback_image_scale,
+            'fallback_max_new_tokens': self.fallback_max_new_tokens,
+            'inference_concurrency': self.inference_concurrency,
+            'preprocess_workers': self.preprocess_workers,
+            'preprocess_prefetch': self.preprocess_prefetch,
+            'memory_release_interval': self.memory_release_interval,
+            'release_page_images': self.release_page_images,
+            'worker_recycle_pages': self.worker_recycle_pages,
+            'worker_recycle_rss_mb': self.worker_recycle_rss_mb,
+            'job_lease_seconds': self.job_lease_seconds,
+            'job_max_attempts': self.job_max_attempts,
+            'job_claim_batch': self.job_claim_batch,
             'ocr_prompt': self.ocr_prompt
         }
+    
+    def fingerprint(self) -> str:
+        """Return a short stable hash of the settings that affect results."""
+        settings = {k: v for k, v in self.to_dict().items() if k not in RUNTIME_FIELDS}
+        payload = json.dumps(settings, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
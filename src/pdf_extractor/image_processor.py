@@ -0,0 +1,137 @@
+"""Image processing utilities for streaming frames of image files."""
+
+from PIL import Image
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Dict
+import logging
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.gif', '.webp']
+
+
+class ImageProcessor:
+    """Image processing class for iterating over the frames of image files.
+    
+    Multi-frame files (e.g. fax TIFFs) are decoded one frame at a time, so
+    memory use stays at a single frame regardless of the frame count.
+    """
+    
+    def __init__(self, config: Optional[Config] = None):
+        """Initialize the image processor.
+        
+        Args:
+            config: Configuration object. If None, uses default config.
+        """
+        self.config = config or Config()
+        self.stats: Dict[str, int] = {'pages': 0}
+    
+    def image_to_frames(self, image_path: str) -> Iterator[Image.Image]:
+        """Lazily convert the frames of an image file to PIL Images.
+        
+        Args:
+            image_path: Path to the image file
+            
+        Yields:
+            RGB PIL Image for each frame, in file order
+            
+        Raises:
+            FileNotFoundError: If the image file doesn't exist
+            Exception: If the image cannot be opened
+        """
+        self.stats = {'pages': 0}
+        yield from self._frames(image_path)
+    
+    def sequence_to_frames(self, image_paths: Iterable[str]) -> Iterator[Image.Image]:
+        """Lazily convert an ordered sequence of image files to PIL Images.
+        
+        Args:
+            image_paths: Image file paths, one or more frames each
+            
+        Yields:
+            RGB PIL Image for each frame of each file, in order
+        """
+        self.stats = {'pages': 0}
+        for image_path in image_paths:
+            yield from self._frames(image_path)
+    
+    def _frames(self, image_path: str) -> Iterator[Image.Image]:
+        """Yield the frames of one image file, decoding one at a time."""
+        try:
+            img = Image.open(image_path)
+        except FileNotFoundError:
+            logger.error(f"Image file not found: {image_path}")
+            raise
+        except Exception as e:
+            logger.error(f"Failed to open image {image_path}: {e}")
+            raise
+        
+        with img:
+            frame_count = getattr(img, 'n_frames', 1)
+            logger.info(f"Processing image: {image_path} ({frame_count} frames)")
+            
+            for frame_num in range(frame_count):
+                try:
+                    img.seek(frame_num)
+                    frame = img.convert("RGB")
+                    logger.debug(f"Decoded frame {frame_num + 1} ({frame.size})")
+                except Exception as e:
+                    logger.error(f"Failed to decode frame {frame_num + 1}: {e}")
+                    continue
+                self.stats['pages'] += 1
+                yield frame
+    
+    def frame_to_image(self, image_path: str, frame_number: int) -> Image.Image:
+        """Decode a single frame of an image file.
+        
+        Args:
+            image_path: Path to the image file
+            frame_number: 1-based frame number
+            
+        Returns:
+            RGB PIL Image of the frame
+            
+        Raises:
+            IndexError: If the frame does not exist
+        """
+        with Image.open(image_path) as img:
+            frame_count = getattr(img, 'n_frames', 1)
+            if not 1 <= frame_number <= frame_count:
+                raise IndexError(
+                    f"Frame {frame_number} out of range for {image_path} ({frame_count} frames)"
+                )
+            img.seek(frame_number - 1)
+            return img.convert("RGB")
+    
+    def extract_frame_count(self, image_path: str) -> int:
+        """Get the number of frames in an image file without decoding them.
+        
+        Args:
+            image_path: Path to the image file
+            
+        Returns:
+            Number of frames in the image
+        """
+        try:
+            with Image.open(image_path) as img:
+                return getattr(img, 'n_frames', 1)
+        except Exception as e:
+            logger.error(f"Failed to get frame count for {image_path}: {e}")
+            raise
+    
+    @staticmethod
+    def list_image_files(directory: str) -> List[str]:
+        """List supported image files of a directory in name order.
+        
+        Args:
+            directory: Directory holding an image sequence
+            
+        Returns:
+            Sorted list of image file paths
+        """
+        return sorted(
+            str(path) for path in Path(directory).iterdir()
+            if path.is_file() and path.suffix.lower() in SUPPORTED_EXTENSIONS
+        )
@@ -0,0 +1,469 @@
+"""File-backed page work queue for sharded extraction across processes and nodes.
+
+The queue is a single SQLite database, typically on a shared filesystem.
+Workers claim page items under a time-limited lease, and commit a result
+or a failure for each one. Items whose lease expires (e.g. the worker died)
+are handed out again, up to ``max_attempts`` times.
+"""
+
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Type
+
+from .config import Config
+from .image_processor import ImageProcessor
+from .ocr_engine import OCREngine
+from .pdf_processor import PDFProcessor
+from .result_store import ResultStore
+from .utils import file_fingerprint, output_file_path, save_results
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    fingerprint TEXT NOT NULL,
+    page_count INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    doc_id INTEGER NOT NULL REFERENCES documents(id),
+    page INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    updated_at REAL,
+    UNIQUE (doc_id, page)
+);
+CREATE INDEX IF NOT EXISTS idx_items_status ON items(status, lease_expires);
+"""
+
+PENDING, LEASED, DONE, FAILED = 'pending', 'leased', 'done', 'failed'
+
+
+def default_worker_id() -> str:
+    """Return a worker id unique across hosts and processes."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class JobQueue:
+    """SQLite work queue of page items with leases and retries.
+    
+    The database uses rollback journaling rather than WAL, because WAL
+    needs shared memory and does not work on network filesystems. Claims
+    take a write lock up front (BEGIN IMMEDIATE), so concurrent workers
+    never receive the same item.
+    """
+    
+    def __init__(self, db_path: str, lease_seconds: float = 600.0, max_attempts: int = 3,
+                 busy_timeout: float = 60.0):
+        """Open (and create if needed) a job queue.
+        
+        Args:
+            db_path: Path to the SQLite database file
+            lease_seconds: How long a claimed item stays reserved for its worker
+            max_attempts: Claims per item before it is marked failed
+            busy_timeout: Seconds to wait for a lock held by another worker
+        """
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=busy_timeout, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=DELETE")
+        self.conn.executescript(SCHEMA)
+    
+    def __enter__(self) -> 'JobQueue':
+        return self
+    
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+    
+    def _transaction(self, fn):
+        """Run a callable inside BEGIN IMMEDIATE ... COMMIT."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn()
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+        return result
+    
+    def add_documents(self, paths: Iterable[str], config: Optional[Config] = None) -> int:
+        """Expand documents into page items.
+        
+        Adding a document that is already queued is a no-op, so a manifest
+        can be re-submitted safely. Paths are stored absolute, so workers may
+        run from any directory; image directories are queued file by file.
+        
+        Args:
+            paths: PDF or image file paths, or image directories
+            config: Configuration object. If None, uses default config.
+            
+        Returns:
+            Number of page items added
+        """
+        config = config or Config()
+        pdf_processor = PDFProcessor(config)
+        image_processor = ImageProcessor(config)
+        
+        files = []
+        for path in map(os.path.abspath, paths):
+            if Path(path).is_dir():
+                files.extend(ImageProcessor.list_image_files(path))
+            else:
+                files.append(path)
+        
+        documents = []
+        for path in files:
+            if Path(path).suffix.lower() == '.pdf':
+                page_count = pdf_processor.extract_page_count(path)
+            else:
+                page_count = image_processor.extract_frame_count(path)
+            documents.append((path, file_fingerprint(path), page_count))
+        
+        def insert():
+            added = 0
+            for path, fingerprint, page_count in documents:
+                cursor = self.conn.execute(
+                    "INSERT OR IGNORE INTO documents (path, fingerprint, page_count) VALUES (?, ?, ?)",
+                    (path, fingerprint, page_count)
+                )
+                if not cursor.rowcount:
+                    continue
+                now = time.time()
+                self.conn.executemany(
+                    "INSERT INTO items (doc_id, page, updated_at) VALUES (?, ?, ?)",
+                    [(cursor.lastrowid, page, now) for page in range(1, page_count + 1)]
+                )
+                added += page_count
+            return added
+        
+        added = self._transaction(insert)
+        logger.info(f"Queued {added} pages from {len(documents)} documents")
+        return added
+    
+    def claim(self, worker_id: str, limit: int = 1) -> List[Dict[str, Any]]:
+        """Lease up to limit items to a worker.
+        
+        Pending items and items whose lease has expired are eligible. Items
+        that expired on their last allowed attempt are marked failed.
+        
+        Args:
+            worker_id: Id of the claiming worker
+            limit: Maximum number of items to claim
+            
+        Returns:
+            Claimed items with 'id', 'path', 'page', 'fingerprint' and 'attempts'
+        """
+        def lease():
+            now = time.time()
+            self.conn.execute(
+                "UPDATE items SET status = ?, error = 'lease expired', updated_at = ? "
+                "WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                (FAILED, now, LEASED, now, self.max_attempts)
+            )
+            rows = self.conn.execute(
+                "SELECT i.id, i.page, i.attempts, d.path, d.fingerprint "
+                "FROM items i JOIN documents d ON d.id = i.doc_id "
+                "WHERE i.status = ? OR (i.status = ? AND i.lease_expires < ?) "
+                "ORDER BY i.id LIMIT ?",
+                (PENDING, LEASED, now, limit)
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE items SET status = ?, worker = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                [(LEASED, worker_id, now + self.lease_seconds, now, row['id']) for row in rows]
+            )
+            return [
+                {'id': row['id'], 'path': row['path'], 'page': row['page'],
+                 'fingerprint': row['fingerprint'], 'attempts': row['attempts'] + 1}
+                for row in rows
+            ]
+        
+        return self._transaction(lease)
+    
+    def heartbeat(self, item_ids: List[int], worker_id: str) -> None:
+        """Extend the leases a worker still holds.
+        
+        Args:
+            item_ids: Ids of items the worker is working on
+            worker_id: Id of the worker
+        """
+        if not item_ids:
+            return
+        expires = time.time() + self.lease_seconds
+        self._transaction(lambda: self.conn.executemany(
+            "UPDATE items SET lease_expires = ? WHERE id = ? AND worker = ? AND status = ?",
+            [(expires, item_id, worker_id, LEASED) for item_id in item_ids]
+        ))
+    
+    def complete(self, item_id: int, worker_id: str, result: Dict[str, Any]) -> bool:
+        """Commit the result of a leased item.
+        
+        Args:
+            item_id: Id of the item
+            worker_id: Id of the worker holding the lease
+            result: Page result dict
+            
+        Returns:
+            False if the worker no longer holds the lease (the item expired
+            and was claimed by another worker), True otherwise
+        """
+        cursor = self._transaction(lambda: self.conn.execute(
+            "UPDATE items SET status = ?, result = ?, error = NULL, updated_at = ? "
+            "WHERE id = ? AND worker = ? AND status = ?",
+            (DONE, json.dumps(result, ensure_ascii=False), time.time(), item_id, worker_id, LEASED)
+        ))
+        return cursor.rowcount == 1
+    
+    def fail(self, item_id: int, worker_id: str, error: str) -> None:
+        """Record a failed attempt; the item is retried until max_attempts.
+        
+        Args:
+            item_id: Id of the item
+            worker_id: Id of the worker holding the lease
+            error: Error message
+        """
+        self._transaction(lambda: self.conn.execute(
+            "UPDATE items SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+            "error = ?, worker = NULL, lease_expires = NULL, updated_at = ? "
+            "WHERE id = ? AND worker = ? AND status = ?",
+            (self.max_attempts, FAILED, PENDING, error, time.time(), item_id, worker_id, LEASED)
+        ))
+    
+    def counts(self) -> Dict[str, int]:
+        """Return the number of items per status."""
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        for row in self.conn.execute("SELECT status, COUNT(*) AS n FROM items GROUP BY status"):
+            counts[row['status']] = row['n']
+        return counts
+    
+    def is_finished(self) -> bool:
+        """Whether every item is done or failed."""
+        counts = self.counts()
+        return counts[PENDING] == 0 and counts[LEASED] == 0
+    
+    def document_results(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Collect page results per document in page order.
+        
+        Returns:
+            Mapping of document path to page result dicts; pages that are not
+            done are reported with their status and last error
+        """
+        documents: Dict[str, List[Dict[str, Any]]] = {}
+        rows = self.conn.execute(
+            "SELECT d.path, i.page, i.status, i.result, i.error "
+            "FROM items i JOIN documents d ON d.id = i.doc_id ORDER BY d.id, i.page"
+        )
+        for row in rows:
+            if row['status'] == DONE:
+                result = json.loads(row['result'])
+            else:
+                result = {'page': row['page'], 'text': '', 'status': row['status'],
+                          'error': row['error']}
+            documents.setdefault(row['path'], []).append(result)
+        return documents
+    
+    def export(self, output_dir: str) -> None:
+        """Write one JSON result file per document, as in batch mode.
+        
+        Args:
+            output_dir: Directory for the result files
+        """
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        for index, (path, pages) in enumerate(self.document_results().items()):
+            save_results(pages, output_file_path(output_dir, index, path))
+    
+    def close(self) -> None:
+        """Close the database."""
+        self.conn.close()
+
+
+class _LeaseKeeper:
+    """Extend a worker's leases from a background thread.
+    
+    A page can take longer to generate than a lease lasts, so the leases of
+    held items are renewed every third of ``lease_seconds`` while the worker
+    is busy. The thread uses a connection of its own, since SQLite
+    connections belong to the thread that opened them.
+    """
+    
+    def __init__(self, queue_path: str, worker_id: str, lease_seconds: float):
+        """Initialize the keeper.
+        
+        Args:
+            queue_path: Path to the job queue database
+            worker_id: Id of the worker holding the leases
+            lease_seconds: Lease duration the queue grants
+        """
+        self.queue_path = queue_path
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self._held: Set[int] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="job-heartbeat", daemon=True)
+        self._thread.start()
+    
+    def hold(self, item_ids: Iterable[int]) -> None:
+        """Start renewing the leases of items."""
+        with self._lock:
+            self._held.update(item_ids)
+    
+    def release(self, item_id: int) -> None:
+        """Stop renewing the lease of a finished item."""
+        with self._lock:
+            self._held.discard(item_id)
+    
+    def stop(self) -> None:
+        """Stop the heartbeat thread."""
+        self._stop.set()
+        self._thread.join()
+    
+    def _run(self) -> None:
+        job_queue = JobQueue(self.queue_path, lease_seconds=self.lease_seconds)
+        try:
+            while not self._stop.wait(self.lease_seconds / 3):
+                with self._lock:
+                    held = list(self._held)
+                try:
+                    job_queue.heartbeat(held, self.worker_id)
+                except sqlite3.Error as e:
+                    logger.warning(f"Failed to extend leases of {len(held)} items: {e}")
+        finally:
+            job_queue.close()
+
+
+def _render_item(item: Dict[str, Any], pdf_processor: PDFProcessor,
+                 image_processor: ImageProcessor):
+    """Render the page image of a work item."""
+    if Path(item['path']).suffix.lower() == '.pdf':
+        return pdf_processor.page_to_image(item['path'], item['page'])
+    return image_processor.frame_to_image(item['path'], item['page'])
+
+
+def run_worker(queue_path: str, config: Optional[Config] = None,
+               worker_id: Optional[str] = None, store_path: Optional[str] = None,
+               max_items: Optional[int] = None, poll_interval: float = 5.0,
+               engine_cls: Type[OCREngine] = OCREngine) -> int:
+    """Claim, process, and commit page items until the queue is finished.
+    
+    Items are claimed ``config.job_claim_batch`` at a time and run through
+    OCREngine.iter_extract_pages, so rendering and preprocessing overlap
+    generation. A background thread keeps the leases of claimed items alive
+    until they are committed, however long a page takes. While other
+    workers still hold leases, the worker polls so it can pick up items
+    whose lease expires.
+    
+    Args:
+        queue_path: Path to the job queue database
+        config: Configuration object. If None, uses default config.
+        worker_id: Worker id; generated from host and pid if None
+        store_path: Optional path of a SQLite result store to also write to.
+            Like the queue, it is opened with a rollback journal instead of
+            WAL, so it may live on the shared filesystem.
+        max_items: Stop after processing this many items
+        poll_interval: Seconds to wait between claims when nothing is claimable
+        engine_cls: OCREngine class to instantiate
+        
+    Returns:
+        Number of items this worker completed
+    """
+    config = config or Config()
+    worker_id = worker_id or default_worker_id()
+    job_queue = JobQueue(queue_path, lease_seconds=config.job_lease_seconds,
+                         max_attempts=config.job_max_attempts)
+    store = None
+    if store_path:
+        store = ResultStore(store_path, journal_mode="DELETE", busy_timeout=60.0)
+    ocr_engine = engine_cls(config)
+    pdf_processor = PDFProcessor(config)
+    image_processor = ImageProcessor(config)
+    lease_keeper = _LeaseKeeper(queue_path, worker_id, config.job_lease_seconds)
+    completed = 0
+    processed = 0
+    
+    logger.info(f"Worker {worker_id} started on {queue_path}")
+    try:
+        while max_items is None or processed < max_items:
+            limit = config.job_claim_batch
+            if max_items is not None:
+                limit = min(limit, max_items - processed)
+            items = job_queue.claim(worker_id, limit)
+            if not items:
+                if job_queue.is_finished():
+                    break
+                time.sleep(poll_interval)
+                continue
+            lease_keeper.hold(item['id'] for item in items)
+            
+            rendered: deque = deque()
+            render_errors = []
+            
+            def pages():
+                for item in items:
+                    try:
+                        image = _render_item(item, pdf_processor, image_processor)
+                    except Exception as e:
+                        render_errors.append((item, str(e)))
+                        continue
+                    rendered.append(item)
+                    yield image
+            
+            for page_result in ocr_engine.iter_extract_pages(pages()):
+                item = rendered.popleft()
+                lease_keeper.release(item['id'])
+                processed += 1
+                if page_result['status'] != 'success':
+                    job_queue.fail(item['id'], worker_id, page_result['error'])
+                    continue
+                
+                result = {
+                    'page': item['page'],
+                    'text': page_result['text'],
+                    'status': 'success',
+                    'elapsed': page_result['elapsed'],
+                    'budget_exceeded': page_result['budget_exceeded'],
+                    'fallback': page_result['fallback'],
+                    'truncated': page_result['truncated'],
+                    'attempt': item['attempts'],
+                }
+                if job_queue.complete(item['id'], worker_id, result):
+                    completed += 1
+                    if store is not None:
+                        store.add_results(item['fingerprint'], config.fingerprint(), [result],
+                                          path=item['path'])
+                else:
+                    logger.warning(f"Lease on {item['path']} page {item['page']} was lost")
+            
+            for item, error in render_errors:
+                logger.error(f"Failed to render {item['path']} page {item['page']}: {error}")
+                lease_keeper.release(item['id'])
+                job_queue.fail(item['id'], worker_id, error)
+                processed += 1
+    finally:
+        lease_keeper.stop()
+        if store is not None:
+            store.close()
+        ocr_engine.close()
+        job_queue.close()
+    
+    logger.info(f"Worker {worker_id} finished, {completed} items completed")
+    return completed
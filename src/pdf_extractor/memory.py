@@ -0,0 +1,105 @@
+"""Memory accounting and release helpers for long-running extraction."""
+
+import ctypes
+import ctypes.util
+import gc
+import logging
+from typing import Dict, Optional
+
+import fitz  # PyMuPDF
+import psutil
+import torch
+
+logger = logging.getLogger(__name__)
+
+_libc = None
+
+
+def rss_mb() -> float:
+    """Return the resident set size of this process in MB."""
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def _malloc_trim() -> bool:
+    """Return freed heap pages to the OS (glibc only).
+    
+    Returns:
+        True if malloc_trim was available and called
+    """
+    global _libc
+    if _libc is None:
+        path = ctypes.util.find_library("c")
+        try:
+            _libc = ctypes.CDLL(path) if path else False
+        except OSError:
+            _libc = False
+    if not _libc or not hasattr(_libc, "malloc_trim"):
+        return False
+    _libc.malloc_trim(0)
+    return True
+
+
+def release_memory(shrink_mupdf: bool = True) -> float:
+    """Release cached and fragmented memory back to the OS.
+    
+    Runs the garbage collector, empties MuPDF's object store, trims the C
+    heap, and releases cached CUDA blocks.
+    
+    Args:
+        shrink_mupdf: Whether to empty MuPDF's internal store. MuPDF is
+            not thread-safe: pass False while another thread may be
+            rendering.
+        
+    Returns:
+        RSS in MB after releasing
+    """
+    gc.collect()
+    if shrink_mupdf:
+        fitz.TOOLS.store_shrink(100)
+    _malloc_trim()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    return rss_mb()
+
+
+class MemoryTracker:
+    """Track RSS growth across documents to find leaks.
+    
+    Call ``start`` before and ``stop`` after each document; ``stop``
+    returns that document's RSS delta. ``growth_mb`` is the growth since the
+    tracker's baseline.
+    """
+    
+    def __init__(self):
+        """Initialize the tracker with the current RSS as baseline."""
+        self.baseline_mb = rss_mb()
+        self._start_mb: Optional[float] = None
+    
+    def start(self) -> float:
+        """Record the RSS at the start of a document.
+        
+        Returns:
+            RSS in MB
+        """
+        self._start_mb = rss_mb()
+        return self._start_mb
+    
+    def stop(self) -> Dict[str, float]:
+        """Record the RSS at the end of a document.
+        
+        Returns:
+            Dict with 'rss_before_mb', 'rss_after_mb' and 'rss_delta_mb'
+        """
+        after = rss_mb()
+        before = self._start_mb if self._start_mb is not None else after
+        self._start_mb = None
+        return {
+            'rss_before_mb': round(before, 1),
+            'rss_after_mb': round(after, 1),
+            'rss_delta_mb': round(after - before, 1),
+        }
+    
+    @property
+    def growth_mb(self) -> float:
+        """RSS growth in MB since the baseline."""
+        return rss_mb() - self.baseline_mb
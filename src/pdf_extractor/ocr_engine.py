@@ -1,12 +1,25 @@
 """OCR Engine for processing images and extracting text."""
 
+import asyncio
+import copy
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
 from PIL import Image
 import torch
-from transformers import AutoTokenizer, AutoProcessor, AutoModelForImageTextToText
-from typing import Union, Optional
+from huggingface_hub import snapshot_download
+from huggingface_hub.utils import LocalEntryNotFoundError
+from transformers import (
+    AutoProcessor, AutoModelForImageTextToText, BatchFeature, CompileConfig,
+    StoppingCriteria, StoppingCriteriaList,
+)
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Union, Optional
 import logging
 
 from .config import Config
+from .pdf_processor import HybridPage
 
 logger = logging.getLogger(__name__)
 
@@ -24,29 +37,169 @@ class OCREngine:
         self.model = None
         self.tokenizer = None
         self.processor = None
+        self.load_timings: Dict[str, float] = {}
+        self._compile_config: Optional[CompileConfig] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._preprocess_executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        # Generation on a shared model is serialized: Qwen2-VL style models
+        # keep per-sequence state (rope_deltas) on the model between the
+        # prefill and the decode steps.
+        self._generate_lock = threading.RLock()
         self._load_model()
     
     def _load_model(self):
-        """Load the OCR model, tokenizer, and processor."""
+        """Load the OCR processor (with its tokenizer) and model.
+        
+        The model is resolved to a local snapshot first, and weights are
+        memory-mapped from safetensors straight into the model. Per-stage
+        timings are kept in ``self.load_timings``.
+        """
         try:
             logger.info(f"Loading model: {self.config.model_path}")
+            start = time.perf_counter()
+            
+            model_dir = self._resolve_model_path()
+            resolved = time.perf_counter()
+            
+            self.processor = AutoProcessor.from_pretrained(model_dir)
+            self.tokenizer = self.processor.tokenizer
+            processor_loaded = time.perf_counter()
             
             self.model = AutoModelForImageTextToText.from_pretrained(
-                self.config.model_path,
+                model_dir,
                 torch_dtype=self.config.torch_dtype,
                 device_map=self.config.device_map,
+                low_cpu_mem_usage=self.config.low_cpu_mem_usage,
+                use_safetensors=self.config.use_safetensors,
             )
             self.model.eval()
+            model_loaded = time.perf_counter()
+            
+            if self.config.compile_generation:
+                self._setup_compiled_generation()
             
-            self.tokenizer = AutoTokenizer.from_pretrained(self.config.model_path)
-            self.processor = AutoProcessor.from_pretrained(self.config.model_path)
+            self.load_timings = {
+                'resolve': round(resolved - start, 3),
+                'processor': round(processor_loaded - resolved, 3),
+                'model': round(model_loaded - processor_loaded, 3),
+                'total': round(model_loaded - start, 3),
+            }
+            logger.info(
+                f"Model loaded in {self.load_timings['total']:.1f}s "
+                f"(resolve {self.load_timings['resolve']:.1f}s, "
+                f"processor {self.load_timings['processor']:.1f}s, "
+                f"model {self.load_timings['model']:.1f}s)"
+            )
             
-            logger.info("Model loaded successfully")
+            if self._compile_config is not None and self.config.compile_warmup:
+                self.warmup()
             
         except Exception as e:
             logger.error(f"Failed to load model: {e}")
             raise
     
+    def _resolve_model_path(self) -> str:
+        """Resolve the configured model to a local directory.
+        
+        Local directories are used as is. Hub ids are served from the local
+        cache snapshot (pinned to ``config.model_revision`` if set) without
+        any network access; the snapshot is only downloaded if it is missing
+        and ``config.local_files_only`` is off.
+        
+        Returns:
+            Path to a local model directory
+        """
+        if Path(self.config.model_path).is_dir():
+            return self.config.model_path
+        
+        try:
+            return snapshot_download(
+                self.config.model_path,
+                revision=self.config.model_revision,
+                local_files_only=True,
+            )
+        except LocalEntryNotFoundError:
+            if self.config.local_files_only:
+                raise
+        
+        logger.info(f"No local snapshot of {self.config.model_path}, downloading")
+        ignore_patterns = ["*.bin", "*.pt", "*.pth"] if self.config.use_safetensors else None
+        return snapshot_download(
+            self.config.model_path,
+            revision=self.config.model_revision,
+            ignore_patterns=ignore_patterns,
+        )
+    
+    def _setup_compiled_generation(self) -> None:
+        """Enable static KV cache generation with a compiled decode step.
+        
+        transformers compiles the single-token decode forward when the cache
+        is static. The gain comes from CUDA graphs cutting kernel launch
+        overhead; on CPU decoding is bound by the matmuls and compiling gives
+        no speedup, so there the setting is ignored.
+        """
+        if self.model.device.type != "cuda":
+            logger.warning("compile_generation only applies on CUDA; generating eagerly")
+            return
+        self._compile_config = CompileConfig(
+            fullgraph=True,
+            dynamic=False,
+            mode="reduce-overhead",
+        )
+        logger.info("Compiled static-cache generation enabled")
+    
+    def warmup(self) -> None:
+        """Compile the decode step ahead of the first page.
+        
+        Runs a short generation on a blank letter-size page, bucketed like a
+        real page, so the typical input shape is compiled at init time.
+        """
+        if self.model is None:
+            raise RuntimeError("Model not loaded. Call _load_model() first.")
+        
+        start = time.perf_counter()
+        zoom = self.config.dpi / 72.0
+        blank = Image.new("RGB", (int(8.5 * 72 * zoom), int(11 * 72 * zoom)), "white")
+        image = self._bucket_image(self.load_and_resize_image(blank))
+        inputs = self._prepare_inputs(image, self.config.ocr_prompt)
+        
+        # Keep the configured max_new_tokens so the static cache has the
+        # same length as in real runs, but stop after a few decode steps.
+        stop = StoppingCriteriaList([_StopAfterCriteria(inputs.input_ids.shape[1] + 3)])
+        self._generate(inputs, stopping_criteria=stop)
+        
+        self.load_timings['warmup'] = round(time.perf_counter() - start, 3)
+        logger.info(f"Warmup for {image.size} finished in {self.load_timings['warmup']:.1f}s")
+    
+    def _bucket_image(self, image: Image.Image) -> Image.Image:
+        """Pad an image to the next configured bucket size in each dimension.
+        
+        Compiled generation recompiles for every new input length, which
+        depends on the image size. Padding with white to a small set of
+        sizes keeps the number of distinct shapes bounded.
+        
+        Args:
+            image: RGB PIL Image no larger than the largest bucket
+            
+        Returns:
+            Padded image, or the input if compiled generation is off
+        """
+        if self._compile_config is None or not self.config.image_size_buckets:
+            return image
+        
+        buckets = sorted(self.config.image_size_buckets)
+        
+        def bucket(side: int) -> int:
+            return next((b for b in buckets if b >= side), side)
+        
+        size = (bucket(image.width), bucket(image.height))
+        if size == image.size:
+            return image
+        padded = Image.new("RGB", size, "white")
+        padded.paste(image, (0, 0))
+        return padded
+    
     def load_and_resize_image(self, image_input: Union[str, Image.Image]) -> Image.Image:
         """Load and resize an image.
         
@@ -57,7 +210,13 @@ class OCREngine:
             Resized PIL Image in RGB format
         """
         if isinstance(image_input, str):
-            img = Image.open(image_input).convert("RGB")
+            with Image.open(image_input) as src:
+                # Let JPEG decode at a reduced scale when the result would be
+                # downsized anyway; other formats ignore the draft request.
+                scale = self.config.max_image_side / max(src.size)
+                if scale < 1:
+                    src.draft("RGB", (int(src.width * scale), int(src.height * scale)))
+                img = src.convert("RGB")
         elif isinstance(image_input, Image.Image):
             img = image_input.convert("RGB")
         else:
@@ -83,50 +242,714 @@ class OCREngine:
         Returns:
             Extracted text as string
         """
+        return self._extract_text(image_input)
+    
+    def extract_page(self, image_input: Union[str, Image.Image],
+                     deadline: Optional[float] = None) -> Dict[str, Any]:
+        """Extract text from a page image within the configured time budget.
+        
+        Generation is cut off when ``config.page_time_budget`` seconds (or the
+        given deadline, whichever is earlier) have passed. If that happens
+        and ``config.budget_retry`` is set, the page is retried once with the
+        image scaled by ``config.fallback_image_scale`` and at most
+        ``config.fallback_max_new_tokens`` new tokens. The retry gets a budget
+        of its own, so a retried page takes up to twice
+        ``config.page_time_budget`` (never past the given deadline).
+        
+        Args:
+            image_input: Either a file path string or PIL Image object
+            deadline: Optional absolute ``time.monotonic()`` deadline, e.g.
+                the end of the document budget
+            
+        Returns:
+            Dict with 'text', 'elapsed' (seconds), 'budget_exceeded' (first
+            attempt was cut off), 'fallback' (None or 'reduced') and
+            'truncated' (returned text was cut off)
+        """
+        return self._extract_page(image_input, deadline)
+
+    def extract_prompts(self, image_input: Union[str, Image.Image],
+                        prompts: Union[Dict[str, str], List[str]]) -> Dict[str, str]:
+        """Extract several outputs from one image, encoding the image once.
+        
+        The image is loaded and preprocessed once, and the part of the model
+        input all prompts share (system message and image) is run through
+        the model once. Each prompt then generates from a copy of that
+        key/value cache, so neither the vision encoder nor the image prefill
+        is repeated per prompt.
+        
+        Args:
+            image_input: Either a file path string or PIL Image object
+            prompts: Mapping of output name to prompt, or a list of prompts
+            
+        Returns:
+            Dict mapping each output name (or each prompt, if a list was
+            given) to its extracted text
+            
+        Raises:
+            ValueError: If no prompts are given
+        """
+        if self.model is None:
+            raise RuntimeError("Model not loaded. Call _load_model() first.")
+        if not prompts:
+            raise ValueError("At least one prompt is required")
+        
+        if not isinstance(prompts, dict):
+            prompts = {prompt: prompt for prompt in prompts}
+        unique = list(dict.fromkeys(prompts.values()))
+        image = self._bucket_image(self.load_and_resize_image(image_input))
+        texts = dict(zip(unique, self._generate_for_prompts(image, unique)))
+        return {name: texts[prompt] for name, prompt in prompts.items()}
+    
+    def extract_batch(self, image_inputs: List[Union[str, Image.Image]],
+                      deadline: Optional[float] = None) -> Dict[str, Any]:
+        """Extract text from several images in shared generate calls.
+        
+        Images run ``config.batch_size`` at a time, with prompts padded on
+        the left so all sequences decode from the same position. This suits
+        small images such as page crops; a batch finishes when its longest
+        output does. All images share one page time budget.
+        
+        Args:
+            image_inputs: File paths or PIL Images
+            deadline: Optional absolute ``time.monotonic()`` deadline
+            
+        Returns:
+            Dict with 'texts' (one per input, in input order), 'tokens'
+            (generated tokens per input, up to and including end of text),
+            'elapsed' (seconds) and 'truncated' (some output was cut off by
+            the budget)
+        """
+        if self.model is None:
+            raise RuntimeError("Model not loaded. Call _load_model() first.")
+        
+        start = time.monotonic()
+        page_deadline = self._page_deadline(start, deadline)
+        batch_size = max(1, self.config.batch_size)
+        texts: List[str] = []
+        tokens: List[int] = []
+        truncated = False
+        
+        for i in range(0, len(image_inputs), batch_size):
+            images = [self._bucket_image(self.load_and_resize_image(image_input))
+                      for image_input in image_inputs[i:i + batch_size]]
+            inputs = self._to_device(self._preprocess_batch(images, self.config.ocr_prompt))
+            overrides = {}
+            if page_deadline is not None:
+                overrides['max_time'] = max(page_deadline - time.monotonic(), 0.0)
+            output = self._generate(inputs, **overrides)
+            texts.extend(self._decode(output, inputs))
+            tokens.extend(self._count_new_tokens(output, inputs))
+            truncated = truncated or (page_deadline is not None
+                                      and time.monotonic() >= page_deadline)
+        
+        return {'texts': texts, 'tokens': tokens,
+                'elapsed': round(time.monotonic() - start, 3), 'truncated': truncated}
+    
+    def extract_hybrid_page(self, page: HybridPage,
+                            deadline: Optional[float] = None) -> Dict[str, Any]:
+        """OCR the image regions of a hybrid page and merge them with its text.
+        
+        The regions are run together with extract_batch under one page
+        time budget.
+        
+        Args:
+            page: Hybrid page from PDFProcessor.pdf_to_hybrid_pages
+            deadline: Optional absolute ``time.monotonic()`` deadline
+            
+        Returns:
+            Page result dict as returned by extract_page, plus 'ocr_regions'
+        """
+        images = page.images
+        batch = self.extract_batch(images, deadline) if images else {
+            'texts': [], 'elapsed': 0.0, 'truncated': False
+        }
+        return {
+            'text': page.merge(batch['texts']),
+            'elapsed': batch['elapsed'],
+            'budget_exceeded': batch['truncated'],
+            'fallback': None,
+            'truncated': batch['truncated'],
+            'ocr_regions': len(images),
+        }
+    
+    def iter_extract_pages(self, images: Iterable[Union[str, Image.Image, HybridPage]],
+                           deadline: Optional[float] = None,
+                           page_count: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Extract text from a stream of pages with preprocessing run ahead.
+        
+        A feeder thread pulls pages from ``images`` (so rendering overlaps
+        inference too) and hands them to ``config.preprocess_workers``
+        threads that resize, patchify and tokenize them into ready tensors.
+        Up to ``config.preprocess_prefetch`` pages are prepared ahead, so
+        ``generate`` is fed back to back. Tensors are shared with the
+        workers, not copied. Hybrid pages take a slot in the same read-ahead
+        and are extracted with extract_hybrid_page when their turn comes.
+        With ``config.release_page_images`` the page images are closed as
+        soon as they have been used; only do this if the caller does not
+        keep them.
+        
+        Args:
+            images: Iterable of file paths, PIL Images or hybrid pages,
+                consumed lazily
+            deadline: Optional absolute ``time.monotonic()`` deadline for the
+                whole stream; pages reached after it are skipped
+            page_count: Number of pages in ``images``, if known. Once the
+                deadline has passed, no more pages are pulled from
+                ``images``; the rest are reported as skipped from this count.
+                Without it, the remaining pages are still read (and
+                preprocessed) to be skipped one by one.
+            
+        Yields:
+            Page result dicts as returned by extract_page, in input order,
+            plus 'status' ('success', 'error' or 'skipped') and 'error' for
+            pages that did not succeed
+        """
+        skipped = {'text': '', 'status': 'skipped', 'error': 'document time budget exceeded'}
+        prefetch = self._prefetch(images)
+        emitted = 0
+        expired = False
+        try:
+            for future in prefetch:
+                if deadline is not None and time.monotonic() >= deadline:
+                    future.cancel()
+                    if page_count is not None:
+                        expired = True
+                        break
+                    emitted += 1
+                    yield dict(skipped)
+                    continue
+                prepared = None
+                try:
+                    prepared = future.result()
+                    if isinstance(prepared[0], HybridPage):
+                        result = self.extract_hybrid_page(prepared[0], deadline)
+                    else:
+                        result = self._extract_page(None, deadline, prepared=prepared)
+                    result['status'] = 'success'
+                except Exception as e:
+                    logger.error(f"Failed to extract page: {e}")
+                    result = {'text': '', 'status': 'error', 'error': str(e)}
+                finally:
+                    if prepared is not None and self.config.release_page_images:
+                        prepared[0].close()
+                    del future, prepared
+                emitted += 1
+                yield result
+        finally:
+            # Stops the feeder and closes the page source
+            prefetch.close()
+        
+        if expired:
+            for _ in range(emitted, page_count):
+                yield dict(skipped)
+    
+    def _prefetch(self, images: Iterable[Union[str, Image.Image]]) -> Iterator[Future]:
+        """Yield futures of _preprocess_page results in input order.
+        
+        Args:
+            images: Iterable of file paths or PIL Images
+            
+        Yields:
+            Futures resolving to (resized image, host-side inputs)
+        """
+        if self.config.preprocess_workers <= 0:
+            for image_input in images:
+                future: Future = Future()
+                try:
+                    future.set_result(self._preprocess_page(
+                        image_input, self.config.release_page_images))
+                except Exception as e:
+                    future.set_exception(e)
+                yield future
+            return
+        
+        executor = self._get_preprocess_executor()
+        ready: queue.Queue = queue.Queue(maxsize=max(1, self.config.preprocess_prefetch))
+        stop = threading.Event()
+        done = object()
+        
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    ready.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def feed():
+            pages = iter(images)
+            try:
+                for image_input in pages:
+                    future = executor.submit(self._preprocess_page, image_input,
+                                             self.config.release_page_images)
+                    if not put(future):
+                        return
+                put(done)
+            except BaseException as e:
+                put(e)
+            finally:
+                if hasattr(pages, 'close'):
+                    pages.close()
+        
+        feeder = threading.Thread(target=feed, name="ocr-feeder", daemon=True)
+        feeder.start()
+        try:
+            while True:
+                item = ready.get()
+                if item is done:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            feeder.join()
+            while not ready.empty():
+                item = ready.get_nowait()
+                if isinstance(item, Future):
+                    item.cancel()
+    
+    def _get_preprocess_executor(self) -> ThreadPoolExecutor:
+        """Return the preprocessing worker pool, creating it on first use."""
+        with self._executor_lock:
+            if self._preprocess_executor is None:
+                self._preprocess_executor = ThreadPoolExecutor(
+                    max_workers=self.config.preprocess_workers,
+                    thread_name_prefix="ocr-preprocess",
+                )
+            return self._preprocess_executor
+    
+    async def aextract_text(self, image_input: Union[str, Image.Image]) -> str:
+        """Extract text from an image without blocking the event loop.
+        
+        Loading, preprocessing and generation run on the engine's inference
+        executor, which admits at most ``config.inference_concurrency`` pages
+        at a time. Generation itself runs one page at a time on the shared
+        model; concurrent pages overlap their loading and preprocessing with
+        it. Cancelling the awaiting task drops the page if it has not
+        started yet, or stops generation at the next token otherwise.
+        
+        Args:
+            image_input: Either a file path string or PIL Image object
+            
+        Returns:
+            Extracted text as string
+        """
+        cancel_event = threading.Event()
+        future = self._get_executor().submit(self._extract_text, image_input, cancel_event)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            cancel_event.set()
+            raise
+    
+    @classmethod
+    async def acreate(cls, config: Optional[Config] = None) -> 'OCREngine':
+        """Construct an engine without blocking the event loop on model loading.
+        
+        Args:
+            config: Configuration object. If None, uses default config.
+            
+        Returns:
+            Initialized OCREngine
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, cls, config)
+    
+    def close(self) -> None:
+        """Shut down the inference and preprocessing executors."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._preprocess_executor is not None:
+            self._preprocess_executor.shutdown(wait=True)
+            self._preprocess_executor = None
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Return the dedicated inference executor, creating it on first use."""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.config.inference_concurrency,
+                    thread_name_prefix="ocr-inference",
+                )
+            return self._executor
+    
+    def _extract_text(self, image_input: Union[str, Image.Image],
+                      cancel_event: Optional[threading.Event] = None) -> str:
+        """Run the full OCR pipeline for one image and return its text.
+        
+        Args:
+            image_input: Either a file path string or PIL Image object
+            cancel_event: Optional event that stops generation when set
+            
+        Returns:
+            Extracted text as string
+        """
+        return self._extract_page(image_input, cancel_event=cancel_event)['text']
+    
+    def _extract_page(self, image_input: Union[str, Image.Image, None],
+                      deadline: Optional[float] = None,
+                      cancel_event: Optional[threading.Event] = None,
+                      prepared: Optional[Tuple[Image.Image, BatchFeature]] = None) -> Dict[str, Any]:
+        """Run the full OCR pipeline for one image under the time budget.
+        
+        Args:
+            image_input: Either a file path string or PIL Image object
+            deadline: Optional absolute time.monotonic() deadline
+            cancel_event: Optional event that stops generation when set
+            prepared: Output of _preprocess_page for the image, if it was
+                already preprocessed; image_input is ignored then
+            
+        Returns:
+            Page result dict as described in extract_page
+        """
         if self.model is None:
             raise RuntimeError("Model not loaded. Call _load_model() first.")
         
+        start = time.monotonic()
+        if prepared is None:
+            prepared = self._preprocess_page(image_input)
+        image, inputs = prepared
+        
+        stopping_criteria = None
+        if cancel_event is not None:
+            stopping_criteria = StoppingCriteriaList([_CancelCriteria(cancel_event)])
+        
+        page_deadline = self._page_deadline(start, deadline)
+        text, truncated = self._run_budgeted(image, page_deadline, stopping_criteria, inputs=inputs)
+        
+        result = {
+            'text': text,
+            'elapsed': 0.0,
+            'budget_exceeded': truncated,
+            'fallback': None,
+            'truncated': truncated,
+        }
+        
+        if truncated and self.config.budget_retry:
+            retry_start = time.monotonic()
+            # The first attempt used up the page budget, so the retry gets a
+            # fresh one: a page is bounded by 2x page_time_budget, and by the
+            # document deadline when there is one.
+            retry_deadline = self._page_deadline(retry_start, deadline)
+            if retry_deadline is None or retry_deadline > retry_start:
+                logger.warning(
+                    f"Page exceeded time budget after {retry_start - start:.1f}s, "
+                    f"retrying at reduced quality"
+                )
+                scale = self.config.fallback_image_scale
+                small = image.resize(
+                    (max(1, int(image.width * scale)), max(1, int(image.height * scale))),
+                    Image.BICUBIC
+                )
+                text, truncated = self._run_budgeted(
+                    small, retry_deadline, stopping_criteria,
+                    max_new_tokens=min(self.config.fallback_max_new_tokens,
+                                       self.config.max_new_tokens),
+                )
+                result.update(text=text, fallback='reduced', truncated=truncated)
+        
+        result['elapsed'] = round(time.monotonic() - start, 3)
+        return result
+    
+    def _page_deadline(self, start: float, deadline: Optional[float]) -> Optional[float]:
+        """Combine the per-page budget starting at start with an outer deadline."""
+        candidates = [deadline] if deadline is not None else []
+        if self.config.page_time_budget is not None:
+            candidates.append(start + self.config.page_time_budget)
+        return min(candidates) if candidates else None
+    
+    def _run_budgeted(self, image: Image.Image, deadline: Optional[float],
+                      stopping_criteria=None, inputs: Optional[BatchFeature] = None,
+                      **overrides) -> Tuple[str, bool]:
+        """Generate text for one image, stopping at the deadline.
+        
+        Args:
+            image: Resized RGB PIL Image
+            deadline: Absolute time.monotonic() deadline, or None for no limit
+            stopping_criteria: Optional transformers StoppingCriteriaList
+            inputs: Host-side model inputs for the image, if already built
+            **overrides: Generation arguments overriding the config values
+            
+        Returns:
+            Tuple of (decoded text, whether generation was cut off by the deadline)
+        """
+        if inputs is None:
+            inputs = self._preprocess(self._bucket_image(image), self.config.ocr_prompt)
+        inputs = self._to_device(inputs)
+        if deadline is not None:
+            overrides['max_time'] = max(deadline - time.monotonic(), 0.0)
+        
+        output = self._generate(inputs, stopping_criteria=stopping_criteria, **overrides)
+        truncated = deadline is not None and time.monotonic() >= deadline
+        return self._decode(output, inputs)[0], truncated
+    
+    def _generate_for_prompts(self, image: Image.Image, prompts: List[str]) -> List[str]:
+        """Generate text for each prompt on one image, sharing the image prefill.
+        
+        Args:
+            image: Preprocessed RGB PIL Image
+            prompts: Distinct instruction texts
+            
+        Returns:
+            Decoded text per prompt
+        """
+        inputs = self._preprocess(image, prompts[0])
+        prefix_len, suffixes = self._split_shared_prefix(image, prompts, inputs)
+        
+        if prefix_len is None:
+            logger.debug("Prompts share no reusable prefix, running them separately")
+            texts = []
+            for i, prompt in enumerate(prompts):
+                prompt_inputs = self._to_device(inputs if i == 0 else self._preprocess(image, prompt))
+                texts.append(self._decode(self._generate(prompt_inputs), prompt_inputs)[0])
+            return texts
+        
+        inputs = self._to_device(inputs)
+        prefix_ids = inputs.input_ids[:, :prefix_len]
+        vision_inputs = {key: value for key, value in inputs.items()
+                         if key not in ('input_ids', 'attention_mask')}
+        texts = []
+        # The prefix prefill sets the model state the prompts decode from. Only
+        # its cache is used, so skip the LM head for all but the last position
+        # (image tokens x vocabulary would be gigabytes of logits).
+        with self._generate_lock:
+            with torch.inference_mode():
+                cache = self.model(input_ids=prefix_ids, attention_mask=torch.ones_like(prefix_ids),
+                                   use_cache=True, logits_to_keep=1, **vision_inputs).past_key_values
+            
+            for i, suffix in enumerate(suffixes):
+                input_ids = torch.cat(
+                    [prefix_ids,
+                     torch.tensor([suffix], dtype=prefix_ids.dtype, device=prefix_ids.device)],
+                    dim=1
+                )
+                prompt_inputs = BatchFeature({'input_ids': input_ids,
+                                              'attention_mask': torch.ones_like(input_ids)})
+                # Generation extends the cache in place; the last prompt can take it
+                prompt_cache = cache if i == len(suffixes) - 1 else copy.deepcopy(cache)
+                output = self._generate(prompt_inputs, past_key_values=prompt_cache)
+                texts.append(self._decode(output, prompt_inputs)[0])
+        return texts
+    
+    def _split_shared_prefix(self, image: Image.Image, prompts: List[str],
+                             inputs: BatchFeature) -> Tuple[Optional[int], List[List[int]]]:
+        """Find the model input prefix shared by all prompts.
+        
+        Args:
+            image: Preprocessed RGB PIL Image
+            prompts: Distinct instruction texts, at least one
+            inputs: Host-side processor outputs for the first prompt
+            
+        Returns:
+            Tuple of (length of the shared prefix in inputs.input_ids, token
+            ids following it for each prompt), or (None, []) if there is a
+            single prompt or the image does not lie within the shared prefix
+        """
+        if len(prompts) < 2:
+            return None, []
+        
+        token_ids = [self.tokenizer(self._chat_text(image, prompt))['input_ids'] for prompt in prompts]
+        shared = 0
+        while (all(len(ids) > shared + 1 for ids in token_ids)
+               and len({ids[shared] for ids in token_ids}) == 1):
+            shared += 1
+        
+        # The processor expands the image placeholder into one token per
+        # patch group; the prefix is reusable only if that happened in it.
+        tail = token_ids[0][shared:]
+        if inputs.input_ids[0, -len(tail):].tolist() != tail:
+            return None, []
+        return inputs.input_ids.shape[1] - len(tail), [ids[shared:] for ids in token_ids]
+    
+    def _preprocess_page(self, image_input: Union[str, Image.Image],
+                         release_input: bool = False) -> Tuple[Image.Image, BatchFeature]:
+        """Load, resize and preprocess one page into host-side model inputs.
+        
+        Safe to run on worker threads ahead of inference. Hybrid pages are
+        passed through as (page, None).
+        
+        Args:
+            image_input: A file path string, PIL Image object or hybrid page
+            release_input: Close image_input once the resized copy exists
+            
+        Returns:
+            Tuple of (resized image, host-side model inputs)
+        """
+        if isinstance(image_input, HybridPage):
+            return image_input, None
         image = self.load_and_resize_image(image_input)
+        if release_input and isinstance(image_input, Image.Image):
+            image_input.close()
+        return image, self._preprocess(self._bucket_image(image), self.config.ocr_prompt)
+    
+    def _prepare_inputs(self, image: Image.Image, prompt: str) -> BatchFeature:
+        """Build model inputs for one image and prompt on the model device.
+        
+        Args:
+            image: Preprocessed RGB PIL Image
+            prompt: Instruction text for the model
+            
+        Returns:
+            Processor outputs moved to the model device
+        """
+        return self._to_device(self._preprocess(image, prompt))
+    
+    def _preprocess(self, image: Image.Image, prompt: str) -> BatchFeature:
+        """Run the chat template, image processor and tokenizer.
         
-        # Prepare the chat template
+        Args:
+            image: Preprocessed RGB PIL Image
+            prompt: Instruction text for the model
+            
+        Returns:
+            Processor outputs on the host, in pinned memory when the model
+            is on CUDA so the device copy can be asynchronous
+        """
+        return self._preprocess_batch([image], prompt)
+    
+    def _preprocess_batch(self, images: List[Image.Image], prompt: str) -> BatchFeature:
+        """Preprocess several images with the same prompt into one batch.
+        
+        Args:
+            images: Preprocessed RGB PIL Images
+            prompt: Instruction text for the model
+            
+        Returns:
+            Host-side processor outputs as in _preprocess, with the prompts
+            padded on the left
+        """
+        texts = [self._chat_text(image, prompt) for image in images]
+        
+        # Left padding keeps the generated tokens aligned across the batch
+        inputs = self.processor(
+            text=texts, 
+            images=images, 
+            padding=True, 
+            padding_side="left",
+            return_tensors="pt"
+        )
+        if self.model.device.type == "cuda":
+            inputs = BatchFeature({
+                key: value.pin_memory() if isinstance(value, torch.Tensor) else value
+                for key, value in inputs.items()
+            })
+        return inputs
+    
+    def _chat_text(self, image: Image.Image, prompt: str) -> str:
+        """Apply the chat template for one image and prompt.
+        
+        Args:
+            image: Preprocessed RGB PIL Image
+            prompt: Instruction text for the model
+            
+        Returns:
+            Templated prompt text with the image placeholder
+        """
         messages = [
             {"role": "system", "content": "You are a helpful assistant."},
             {"role": "user", "content": [
                 {"type": "image", "image": image},
-                {"type": "text", "text": self.config.ocr_prompt},
+                {"type": "text", "text": prompt},
             ]},
         ]
-        
-        # Apply chat template and prepare inputs
-        text = self.processor.apply_chat_template(
+        return self.processor.apply_chat_template(
             messages, 
             tokenize=False, 
             add_generation_prompt=True
         )
-        inputs = self.processor(
-            text=[text], 
-            images=[image], 
-            padding=True, 
-            return_tensors="pt"
-        ).to(self.model.device)
-        
-        # Generate text
-        with torch.inference_mode():
-            output = self.model.generate(
-                **inputs,
-                max_new_tokens=self.config.max_new_tokens,
-                do_sample=self.config.do_sample,
-                temperature=self.config.temperature,
-                eos_token_id=self.tokenizer.eos_token_id,
-            )
+    
+    def _to_device(self, inputs: BatchFeature) -> BatchFeature:
+        """Move host-side inputs to the model device.
+        
+        A no-op on CPU; on CUDA the copy from pinned memory is non-blocking.
+        """
+        return inputs.to(self.model.device, non_blocking=True)
+    
+    def _generate(self, inputs, stopping_criteria=None, **overrides):
+        """Run generation on prepared inputs.
         
-        # Decode the generated text
+        Args:
+            inputs: Processor outputs from _prepare_inputs
+            stopping_criteria: Optional transformers StoppingCriteriaList
+            **overrides: Generation arguments overriding the config values
+            
+        Returns:
+            Output token ids including the prompt
+        """
+        generate_kwargs = {
+            'max_new_tokens': self.config.max_new_tokens,
+            'do_sample': self.config.do_sample,
+            'temperature': self.config.temperature,
+            'eos_token_id': self.tokenizer.eos_token_id,
+        }
+        # A caller-provided cache (prefix reuse) replaces the static one
+        if self._compile_config is not None and 'past_key_values' not in overrides:
+            generate_kwargs['cache_implementation'] = "static"
+            generate_kwargs['compile_config'] = self._compile_config
+        generate_kwargs.update(overrides)
+        if stopping_criteria is not None:
+            generate_kwargs['stopping_criteria'] = stopping_criteria
+        
+        with self._generate_lock, torch.inference_mode():
+            return self.model.generate(**inputs, **generate_kwargs)
+    
+    def _decode(self, output, inputs) -> List[str]:
+        """Decode generated tokens, dropping the prompt.
+        
+        Args:
+            output: Output token ids from _generate
+            inputs: Processor outputs the generation was run on
+            
+        Returns:
+            Decoded text per batch entry
+        """
         input_len = inputs.input_ids.shape[1]
         gen_only = output[:, input_len:]
-        extracted_text = self.processor.batch_decode(
+        return self.processor.batch_decode(
             gen_only, 
             skip_special_tokens=True, 
             clean_up_tokenization_spaces=True
-        )[0]
+        )
+    
+    def _count_new_tokens(self, output, inputs) -> List[int]:
+        """Count generated tokens per batch entry, ignoring padding after the end.
         
-        return extracted_text
+        Args:
+            output: Output token ids from _generate
+            inputs: Processor outputs the generation was run on
+            
+        Returns:
+            Number of generated tokens per batch entry
+        """
+        stop_ids = {self.tokenizer.eos_token_id, getattr(self.tokenizer, 'pad_token_id', None)}
+        counts = []
+        for row in output[:, inputs.input_ids.shape[1]:].tolist():
+            end = next((i for i, token in enumerate(row) if token in stop_ids), None)
+            counts.append(len(row) if end is None else end + 1)
+        return counts
+
+
+class _CancelCriteria(StoppingCriteria):
+    """Stopping criteria that ends generation once an event is set."""
+    
+    def __init__(self, event: threading.Event):
+        self.event = event
+    
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.event.is_set(),
+                          dtype=torch.bool, device=input_ids.device)
+
+
+class _StopAfterCriteria(StoppingCriteria):
+    """Stopping criteria that ends generation at a total sequence length."""
+    
+    def __init__(self, max_length: int):
+        self.max_length = max_length
+    
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), input_ids.shape[1] >= self.max_length,
+                          dtype=torch.bool, device=input_ids.device)
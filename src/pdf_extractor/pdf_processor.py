@@ -1,14 +1,82 @@
 """PDF processing utilities for converting PDF pages to images."""
 
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 import fitz  # PyMuPDF
 from PIL import Image
-from typing import Iterator, Optional
+from typing import AsyncIterator, Iterator, List, Optional, Dict, Tuple, Union
 import logging
 
 from .config import Config
 
 logger = logging.getLogger(__name__)
 
+# Minimum fraction of the page an embedded image must cover (and of the image
+# that must lie on the page) for the page to qualify for direct extraction.
+MIN_PAGE_COVERAGE = 0.95
+MIN_VISIBLE_FRACTION = 0.99
+
+# Maps the sign pattern of the image placement matrix to the PIL transpose
+# that reproduces the on-page orientation. Axis-aligned matrices are keyed by
+# (a > 0, d > 0), quarter-turned ones by (b > 0, c > 0).
+_AXIS_ALIGNED_TRANSPOSE = {
+    (True, True): None,
+    (False, False): Image.Transpose.ROTATE_180,
+    (True, False): Image.Transpose.FLIP_TOP_BOTTOM,
+    (False, True): Image.Transpose.FLIP_LEFT_RIGHT,
+}
+_QUARTER_TURN_TRANSPOSE = {
+    (True, False): Image.Transpose.ROTATE_270,
+    (False, True): Image.Transpose.ROTATE_90,
+    (True, True): Image.Transpose.TRANSPOSE,
+    (False, False): Image.Transpose.TRANSVERSE,
+}
+
+# Margin (in points) added around image regions cropped for OCR.
+REGION_MARGIN = 2.0
+
+
+@dataclass
+class PageSegment:
+    """A piece of a hybrid page: native text, or an image region to OCR."""
+    
+    bbox: Tuple[float, float, float, float]
+    text: Optional[str] = None
+    image: Optional[Image.Image] = None
+
+
+@dataclass
+class HybridPage:
+    """A page split into native text and image regions, in reading order."""
+    
+    segments: List[PageSegment]
+    
+    @property
+    def images(self) -> List[Image.Image]:
+        """Image regions to OCR, in reading order."""
+        return [segment.image for segment in self.segments if segment.image is not None]
+    
+    def merge(self, texts: List[str]) -> str:
+        """Join the native text with the OCR text of the image regions.
+        
+        Args:
+            texts: OCR text for each of ``self.images``, in the same order
+            
+        Returns:
+            Page text in reading order
+        """
+        ocr_texts = iter(texts)
+        parts = [segment.text if segment.image is None else next(ocr_texts)
+                 for segment in self.segments]
+        return "\n\n".join(part.strip() for part in parts if part.strip())
+    
+    def close(self) -> None:
+        """Close the region images."""
+        for image in self.images:
+            image.close()
+
 
 class PDFProcessor:
     """PDF processing class for converting PDF pages to images."""
@@ -20,10 +88,19 @@ class PDFProcessor:
             config: Configuration object. If None, uses default config.
         """
         self.config = config or Config()
+        self.stats: Dict[str, int] = {'pages': 0, 'fast_path_pages': 0}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
     
     def pdf_to_images(self, pdf_path: str) -> Iterator[Image.Image]:
         """Convert PDF pages to PIL Images.
         
+        Pages that consist of a single full-page embedded image (typical for
+        scanned documents) are extracted directly instead of being rendered,
+        when ``config.extract_embedded_images`` is enabled. Counts are kept
+        in ``self.stats``. Every ``config.memory_release_interval`` pages
+        MuPDF's object store is emptied by the iterating thread.
+        
         Args:
             pdf_path: Path to the PDF file
             
@@ -34,6 +111,33 @@ class PDFProcessor:
             FileNotFoundError: If PDF file doesn't exist
             Exception: If PDF cannot be processed
         """
+        return self._iter_pages(pdf_path, hybrid=False)
+    
+    def pdf_to_hybrid_pages(self, pdf_path: str) -> Iterator[Union[Image.Image, HybridPage]]:
+        """Convert PDF pages for hybrid extraction.
+        
+        Pages with a text layer whose images and vector graphics cover at
+        most ``config.hybrid_max_region_coverage`` of the page become a
+        HybridPage: the native text blocks plus crops of just the image
+        regions. Pages without images yield a HybridPage with no regions and
+        need no OCR at all. All other pages are converted as in pdf_to_images.
+        ``self.stats`` also counts 'hybrid_pages'.
+        
+        Args:
+            pdf_path: Path to the PDF file
+            
+        Yields:
+            A HybridPage or a full-page PIL Image for each page
+        """
+        return self._iter_pages(pdf_path, hybrid=True)
+    
+    def _iter_pages(self, pdf_path: str,
+                    hybrid: bool) -> Iterator[Union[Image.Image, HybridPage]]:
+        """Open a PDF and convert its pages one at a time."""
+        self.stats = {'pages': 0, 'fast_path_pages': 0}
+        if hybrid:
+            self.stats['hybrid_pages'] = 0
+        
         try:
             doc = fitz.open(pdf_path)
             logger.info(f"Processing PDF: {pdf_path} ({len(doc)} pages)")
@@ -41,18 +145,34 @@ class PDFProcessor:
             zoom = self.config.dpi / 72.0
             mat = fitz.Matrix(zoom, zoom)
             
-            for page_num, page in enumerate(doc, 1):
-                try:
-                    pix = page.get_pixmap(matrix=mat, alpha=False)
-                    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                    logger.debug(f"Converted page {page_num} to image ({img.size})")
-                    yield img
-                except Exception as e:
-                    logger.error(f"Failed to convert page {page_num}: {e}")
-                    continue
+            try:
+                for page_num, page in enumerate(doc, 1):
+                    try:
+                        item = self._analyze_page(page, mat) if hybrid else None
+                        if item is not None:
+                            self.stats['hybrid_pages'] += 1
+                            logger.debug(f"Split page {page_num} into {len(item.segments)} "
+                                         f"segments ({len(item.images)} to OCR)")
+                        else:
+                            item = self._page_to_image(doc, page, page_num, zoom, mat)
+                        self.stats['pages'] += 1
+                        yield item
+                        # MuPDF is not thread-safe, so its store is emptied here,
+                        # on the thread that renders the pages
+                        interval = self.config.memory_release_interval
+                        if interval and self.stats['pages'] % interval == 0:
+                            fitz.TOOLS.store_shrink(100)
+                    except Exception as e:
+                        logger.error(f"Failed to convert page {page_num}: {e}")
+                        continue
+            finally:
+                doc.close()
             
-            doc.close()
-            logger.info("PDF processing completed")
+            logger.info(
+                f"PDF processing completed ({self.stats['fast_path_pages']}/"
+                f"{self.stats['pages']} pages via embedded image fast path"
+                + (f", {self.stats['hybrid_pages']} hybrid" if hybrid else "") + ")"
+            )
             
         except FileNotFoundError:
             logger.error(f"PDF file not found: {pdf_path}")
@@ -61,6 +181,275 @@ class PDFProcessor:
             logger.error(f"Failed to process PDF {pdf_path}: {e}")
             raise
     
+    def page_to_image(self, pdf_path: str, page_number: int) -> Image.Image:
+        """Convert a single PDF page to a PIL Image.
+        
+        Args:
+            pdf_path: Path to the PDF file
+            page_number: 1-based page number
+            
+        Returns:
+            PIL Image of the page
+            
+        Raises:
+            IndexError: If the page does not exist
+        """
+        zoom = self.config.dpi / 72.0
+        doc = fitz.open(pdf_path)
+        try:
+            if not 1 <= page_number <= len(doc):
+                raise IndexError(f"Page {page_number} out of range for {pdf_path} ({len(doc)} pages)")
+            return self._page_to_image(doc, doc[page_number - 1], page_number, zoom,
+                                       fitz.Matrix(zoom, zoom))
+        finally:
+            doc.close()
+    
+    def _page_to_image(self, doc, page, page_num: int, zoom: float, mat) -> Image.Image:
+        """Extract or render one page, preferring the embedded image fast path."""
+        img = None
+        if self.config.extract_embedded_images:
+            img = self._extract_embedded_image(doc, page, zoom)
+        
+        if img is not None:
+            self.stats['fast_path_pages'] += 1
+            logger.debug(f"Extracted embedded image for page {page_num} ({img.size})")
+        else:
+            pix = page.get_pixmap(matrix=mat, alpha=False)
+            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+            logger.debug(f"Converted page {page_num} to image ({img.size})")
+        return img
+    
+    def _analyze_page(self, page, mat) -> Optional[HybridPage]:
+        """Split a mixed page into native text blocks and image regions.
+        
+        Image placements and clusters of vector drawings (charts, stamps,
+        figures) form the regions; overlapping regions are merged, and text
+        blocks inside a region are left to the OCR of that region. Text
+        blocks keep PyMuPDF's block order, which follows the columns of
+        multi-column layouts; each region is placed before the first text
+        block of its column that starts below it.
+        
+        Args:
+            page: PyMuPDF page
+            mat: Render matrix for the region crops
+            
+        Returns:
+            HybridPage, or None if the page should be OCR'd in full (too
+            little text, regions covering too much of it, or rotated)
+        """
+        if page.rotation:
+            return None
+        
+        blocks = [b for b in page.get_text("blocks") if b[6] == 0 and b[4].strip()]
+        if sum(len(b[4].strip()) for b in blocks) < self.config.hybrid_min_text_chars:
+            return None
+        
+        page_rect = page.rect
+        page_area = page_rect.get_area()
+        max_area = self.config.hybrid_max_region_coverage * page_area
+        
+        rects = [fitz.Rect(info['bbox']) & page_rect for info in page.get_image_info()]
+        # Page-sized background fills and frames are not content.
+        drawings = [d for d in page.get_drawings()
+                    if (d['rect'] & page_rect).get_area() <= max_area]
+        if drawings:
+            rects.extend(page.cluster_drawings(drawings=drawings))
+        
+        regions = []
+        for rect in (r + (-REGION_MARGIN, -REGION_MARGIN, REGION_MARGIN, REGION_MARGIN)
+                     for r in rects if not r.is_empty):
+            # Grow the new region by every region it touches until stable
+            while True:
+                touching = [r for r in regions if r.intersects(rect)]
+                if not touching:
+                    break
+                for r in touching:
+                    regions.remove(r)
+                    rect |= r
+            regions.append(rect)
+        
+        min_area = self.config.hybrid_min_region_area * page_area
+        regions = [r & page_rect for r in regions if (r & page_rect).get_area() >= min_area]
+        if sum(r.get_area() for r in regions) > max_area:
+            return None
+        
+        segments = []
+        for x0, y0, x1, y1, text, _, _ in blocks:
+            center = fitz.Point((x0 + x1) / 2, (y0 + y1) / 2)
+            if not any(center in r for r in regions):
+                segments.append(PageSegment((x0, y0, x1, y1), text=text))
+        for r in sorted(regions, key=lambda r: (r.y0, r.x0)):
+            pix = page.get_pixmap(matrix=mat, clip=r, alpha=False)
+            image = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+            segments.insert(self._region_position(segments, r), PageSegment(tuple(r), image=image))
+        
+        return HybridPage(segments)
+    
+    @staticmethod
+    def _region_position(segments: List[PageSegment], region) -> int:
+        """Index at which an image region goes among the text segments.
+        
+        That is before the first text block of the same column (overlapping
+        the region horizontally) that starts below the region's top, else
+        after the last block of that column, else at the end.
+        """
+        position = len(segments)
+        for i, segment in enumerate(segments):
+            x0, y0, x1, _ = segment.bbox
+            if segment.text is None or x1 <= region.x0 or x0 >= region.x1:
+                continue
+            if y0 >= region.y0:
+                return i
+            position = i + 1
+        return position
+    
+    async def apdf_to_images(self, pdf_path: str) -> AsyncIterator[Image.Image]:
+        """Asynchronously iterate over PDF pages as PIL Images.
+        
+        Each page is rendered on the processor's render thread. MuPDF is not
+        thread-safe, so concurrent iterators of one processor take turns on
+        that single thread; use one PDFProcessor for all of them. Closing or
+        cancelling the iterator closes the document.
+        
+        Args:
+            pdf_path: Path to the PDF file
+            
+        Yields:
+            PIL Image objects for each page
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        pages = self.pdf_to_images(pdf_path)
+        done = object()
+        try:
+            while True:
+                img = await loop.run_in_executor(executor, next, pages, done)
+                if img is done:
+                    break
+                yield img
+        finally:
+            await loop.run_in_executor(executor, pages.close)
+    
+    def close(self) -> None:
+        """Shut down the render executor used by the async API."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Return the dedicated render executor, creating it on first use.
+        
+        It has a single thread, so MuPDF is never entered concurrently.
+        """
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=1,
+                    thread_name_prefix="pdf-render",
+                )
+            return self._executor
+    
+    def _extract_embedded_image(self, doc, page, zoom: float) -> Optional[Image.Image]:
+        """Extract the page image directly if the page is a single scanned image.
+        
+        Args:
+            doc: Open PyMuPDF document
+            page: PyMuPDF page
+            zoom: Render zoom factor (dpi / 72) used to cap the output size
+            
+        Returns:
+            RGB PIL Image oriented as rendered, or None if the page does not
+            qualify and must be rendered instead
+        """
+        images = page.get_images(full=True)
+        if len(images) != 1:
+            return None
+        
+        xref, smask = images[0][0], images[0][1]
+        if smask:
+            return None  # transparency must be composited by the renderer
+        
+        placements = page.get_image_rects(xref, transform=True)
+        if len(placements) != 1:
+            return None
+        
+        matrix = placements[0][1] * page.rotation_matrix
+        bbox = fitz.Rect(0, 0, 1, 1) * matrix
+        visible = bbox & page.rect
+        if bbox.is_empty or visible.is_empty:
+            return None
+        if (visible.get_area() < MIN_PAGE_COVERAGE * page.rect.get_area()
+                or visible.get_area() < MIN_VISIBLE_FRACTION * bbox.get_area()):
+            return None
+        
+        transpose = self._placement_transpose(matrix)
+        if transpose is False:
+            return None
+        
+        # Anything else drawn on the page (visible text, vector graphics)
+        # would be lost by extracting the image alone.
+        if any(span['type'] != 3 for span in page.get_texttrace()):
+            return None
+        if page.get_drawings():
+            return None
+        
+        pix = fitz.Pixmap(doc, xref)
+        if pix.alpha or pix.colorspace is None:
+            return None
+        if pix.colorspace.n not in (1, 3):
+            pix = fitz.Pixmap(fitz.csRGB, pix)
+        mode = "L" if pix.n == 1 else "RGB"
+        img = Image.frombytes(mode, [pix.width, pix.height], pix.samples)
+        
+        if transpose is not None:
+            img = img.transpose(transpose)
+        
+        # Match the placed aspect ratio (fax images often have non-square
+        # pixels, e.g. 204x98 dpi) at the resolution of the denser axis, but
+        # never beyond the render size: upscaling would only interpolate.
+        target_w = max(1, round(bbox.width * zoom))
+        target_h = max(1, round(bbox.height * zoom))
+        scale = min(1.0, max(img.width / target_w, img.height / target_h))
+        size = (max(1, round(target_w * scale)), max(1, round(target_h * scale)))
+        if size != img.size:
+            img = img.resize(size, Image.BICUBIC)
+        
+        return img.convert("RGB")
+    
+    @staticmethod
+    def _placement_transpose(matrix):
+        """Return the PIL transpose matching an image placement matrix.
+        
+        Args:
+            matrix: Matrix mapping the image unit square to the rotated page
+            
+        Returns:
+            A PIL transpose constant, None if no transpose is needed, or
+            False if the image is skewed and cannot be reproduced by a
+            lossless transpose
+        """
+        eps = 1e-3 * max(abs(matrix.a), abs(matrix.b), abs(matrix.c), abs(matrix.d))
+        if abs(matrix.b) <= eps and abs(matrix.c) <= eps:
+            return _AXIS_ALIGNED_TRANSPOSE[(matrix.a > 0, matrix.d > 0)]
+        if abs(matrix.a) <= eps and abs(matrix.d) <= eps:
+            return _QUARTER_TURN_TRANSPOSE[(matrix.b > 0, matrix.c > 0)]
+        return False
+    
+    def page_text_lengths(self, pdf_path: str) -> List[int]:
+        """Get the number of text layer characters on each page of a PDF.
+        
+        Args:
+            pdf_path: Path to the PDF file
+            
+        Returns:
+            Non-whitespace character count per page (0 for scanned pages)
+        """
+        doc = fitz.open(pdf_path)
+        try:
+            return [len("".join(page.get_text().split())) for page in doc]
+        finally:
+            doc.close()
+    
     def extract_page_count(self, pdf_path: str) -> int:
         """Get the number of pages in a PDF.
         
@@ -0,0 +1,120 @@
+"""Document-level extraction pipeline shared by the CLI modes."""
+
+import logging
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Union
+
+from PIL import Image
+
+from .config import Config
+from .image_processor import ImageProcessor
+from .memory import release_memory
+from .ocr_engine import OCREngine
+from .pdf_processor import HybridPage, PDFProcessor
+
+logger = logging.getLogger(__name__)
+
+
+def iter_document_pages(path: str, config: Config) -> Iterator[Union[Image.Image, HybridPage]]:
+    """Open a PDF, image file, or image sequence directory as a page stream.
+    
+    With ``config.hybrid_extraction`` mixed PDF pages come as HybridPage.
+    
+    Args:
+        path: PDF path, image path, or directory of images
+        config: Configuration object
+        
+    Returns:
+        Lazy iterator over page images (and hybrid pages)
+    """
+    if Path(path).is_dir():
+        image_processor = ImageProcessor(config)
+        return image_processor.sequence_to_frames(image_processor.list_image_files(path))
+    if Path(path).suffix.lower() == '.pdf':
+        if config.hybrid_extraction:
+            return PDFProcessor(config).pdf_to_hybrid_pages(path)
+        return PDFProcessor(config).pdf_to_images(path)
+    return ImageProcessor(config).image_to_frames(path)
+
+
+def document_page_count(path: str, config: Config) -> int:
+    """Count the pages of a PDF, image file, or image sequence directory.
+    
+    Args:
+        path: PDF path, image path, or directory of images
+        config: Configuration object
+        
+    Returns:
+        Number of pages iter_document_pages yields for path
+    """
+    if Path(path).is_dir():
+        image_processor = ImageProcessor(config)
+        return sum(image_processor.extract_frame_count(image_file)
+                   for image_file in image_processor.list_image_files(path))
+    if Path(path).suffix.lower() == '.pdf':
+        return PDFProcessor(config).extract_page_count(path)
+    return ImageProcessor(config).extract_frame_count(path)
+
+
+def extract_document(ocr_engine: OCREngine, pages: Iterable[Union[Image.Image, HybridPage]],
+                     config: Config, page_count: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Run OCR over the pages of one document under its time budget.
+    
+    Full-page images and hybrid pages go through the engine's prefetching
+    page stream in order (see OCREngine.iter_extract_pages); hybrid pages
+    report the number of OCR'd regions in 'ocr_regions'.
+    
+    Every ``config.memory_release_interval`` pages the process releases
+    cached memory (see memory.release_memory). MuPDF's store is left to
+    the page source, since pages are rendered on the prefetch feeder thread
+    (see PDFProcessor.pdf_to_images).
+    
+    Args:
+        ocr_engine: Loaded OCR engine
+        pages: Iterable of page images or hybrid pages, consumed lazily
+        config: Configuration object
+        page_count: Number of pages, if known (see document_page_count).
+            Lets pages past the document time budget be skipped without
+            rendering them.
+        
+    Yields:
+        Page result dicts with 'page', 'text', 'status' and either the
+        timing fields of OCREngine.extract_page or 'error'
+    """
+    doc_deadline = None
+    if config.document_time_budget is not None:
+        doc_deadline = time.monotonic() + config.document_time_budget
+    
+    page_results = ocr_engine.iter_extract_pages(pages, deadline=doc_deadline,
+                                                page_count=page_count)
+    for page_num, page_result in enumerate(page_results, 1):
+        if page_result['status'] == 'success':
+            result = {
+                'page': page_num,
+                'text': page_result['text'],
+                'status': 'success',
+                'elapsed': page_result['elapsed'],
+                'budget_exceeded': page_result['budget_exceeded'],
+                'fallback': page_result['fallback'],
+                'truncated': page_result['truncated']
+            }
+            if 'ocr_regions' in page_result:
+                result['ocr_regions'] = page_result['ocr_regions']
+        else:
+            if page_result['status'] == 'skipped':
+                logger.warning(f"Skipped page {page_num}: {page_result['error']}")
+            else:
+                logger.error(f"Failed to process page {page_num}: {page_result['error']}")
+            result = {
+                'page': page_num,
+                'text': '',
+                'status': page_result['status'],
+                'error': page_result['error']
+            }
+        
+        if config.memory_release_interval and page_num % config.memory_release_interval == 0:
+            release_memory(shrink_mupdf=False)
+        
+        yield result
+
@@ -0,0 +1,260 @@
+"""SQLite-backed store for extraction results with full-text search."""
+
+import sqlite3
+import time
+import logging
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+from .utils import file_fingerprint
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    fingerprint TEXT PRIMARY KEY,
+    path TEXT,
+    added_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_documents_path ON documents(path);
+
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY,
+    doc_fingerprint TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    config_fingerprint TEXT NOT NULL,
+    status TEXT NOT NULL,
+    text TEXT NOT NULL DEFAULT '',
+    error TEXT,
+    created_at REAL NOT NULL,
+    UNIQUE (doc_fingerprint, page, config_fingerprint)
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5(
+    text, content='pages', content_rowid='id'
+);
+
+CREATE TRIGGER IF NOT EXISTS pages_ai AFTER INSERT ON pages BEGIN
+    INSERT INTO pages_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS pages_ad AFTER DELETE ON pages BEGIN
+    INSERT INTO pages_fts(pages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS pages_au AFTER UPDATE OF text ON pages BEGIN
+    INSERT INTO pages_fts(pages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    INSERT INTO pages_fts(rowid, text) VALUES (new.id, new.text);
+END;
+"""
+
+_UPSERT_PAGE = """
+INSERT INTO pages (doc_fingerprint, page, config_fingerprint, status, text, error, created_at)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (doc_fingerprint, page, config_fingerprint) DO UPDATE SET
+    status = excluded.status,
+    text = excluded.text,
+    error = excluded.error,
+    created_at = excluded.created_at
+"""
+
+_PAGE_COLUMNS = "doc_fingerprint, page, config_fingerprint, status, text, error, created_at"
+
+
+class ResultStore:
+    """Indexed result store keyed by document, page, and config fingerprint.
+    
+    Writes are buffered and committed in batches, one transaction per batch.
+    Page text is indexed with SQLite FTS5 for ``search``.
+    """
+    
+    def __init__(self, db_path: str, batch_size: int = 500,
+                 journal_mode: Optional[str] = None, busy_timeout: float = 5.0):
+        """Open (and create if needed) a result store.
+        
+        Args:
+            db_path: Path to the SQLite database file
+            batch_size: Number of buffered page writes that triggers a commit
+            journal_mode: SQLite journal mode. If None, a new database uses
+                WAL and an existing one keeps its mode. WAL needs shared
+                memory and does not work on network filesystems; use
+                "DELETE" for a store shared by several machines.
+            busy_timeout: Seconds to wait for a lock held by another writer
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self._pending: List[Tuple] = []
+        self._pending_docs: Dict[str, Optional[str]] = {}
+        
+        if journal_mode is None and not Path(db_path).exists():
+            journal_mode = "WAL"
+        
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=busy_timeout)
+        self.conn.row_factory = sqlite3.Row
+        if journal_mode is not None:
+            self.conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+    
+    def __enter__(self) -> 'ResultStore':
+        return self
+    
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+    
+    def add_document(self, fingerprint: str, path: Optional[str] = None) -> None:
+        """Register a document so it can be looked up by path.
+        
+        Args:
+            fingerprint: Document content fingerprint
+            path: Source path of the document
+        """
+        self._pending_docs[fingerprint] = path
+    
+    def add_result(self, doc_fingerprint: str, config_fingerprint: str,
+                   result: Dict[str, Any]) -> None:
+        """Buffer one page result for writing.
+        
+        Args:
+            doc_fingerprint: Document content fingerprint
+            config_fingerprint: Fingerprint of the config that produced the result
+            result: Page result dict with 'page', 'text', 'status' and optional 'error'
+        """
+        self._pending.append((
+            doc_fingerprint,
+            result['page'],
+            config_fingerprint,
+            result.get('status', 'success'),
+            result.get('text', ''),
+            result.get('error'),
+            time.time(),
+        ))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+    
+    def add_results(self, doc_fingerprint: str, config_fingerprint: str,
+                    results: List[Dict[str, Any]], path: Optional[str] = None) -> None:
+        """Buffer all page results of a document.
+        
+        Args:
+            doc_fingerprint: Document content fingerprint
+            config_fingerprint: Fingerprint of the config that produced the results
+            results: List of page result dicts
+            path: Source path of the document
+        """
+        self.add_document(doc_fingerprint, path)
+        for result in results:
+            self.add_result(doc_fingerprint, config_fingerprint, result)
+    
+    def flush(self) -> None:
+        """Commit all buffered writes in a single transaction."""
+        if not self._pending and not self._pending_docs:
+            return
+        
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO documents (fingerprint, path, added_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (fingerprint) DO UPDATE SET path = COALESCE(excluded.path, path)",
+                [(fp, path, now) for fp, path in self._pending_docs.items()]
+            )
+            self.conn.executemany(_UPSERT_PAGE, self._pending)
+        
+        logger.debug(f"Committed {len(self._pending)} page results to {self.db_path}")
+        self._pending = []
+        self._pending_docs = {}
+    
+    def resolve_document(self, ref: str) -> str:
+        """Resolve a file path or stored path to a document fingerprint.
+        
+        Args:
+            ref: Existing file path, path recorded in the store, or fingerprint
+            
+        Returns:
+            Document fingerprint
+        """
+        if Path(ref).is_file():
+            return file_fingerprint(ref)
+        row = self.conn.execute(
+            "SELECT fingerprint FROM documents WHERE path = ? ORDER BY added_at DESC LIMIT 1",
+            (ref,)
+        ).fetchone()
+        return row['fingerprint'] if row else ref
+    
+    def get_page(self, doc_fingerprint: str, page: int,
+                 config_fingerprint: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Look up a single page result.
+        
+        Args:
+            doc_fingerprint: Document content fingerprint
+            page: 1-based page number
+            config_fingerprint: Restrict to one config; newest result if None
+            
+        Returns:
+            Page result dict, or None if not stored
+        """
+        self.flush()
+        query = f"SELECT {_PAGE_COLUMNS} FROM pages WHERE doc_fingerprint = ? AND page = ?"
+        params: List[Any] = [doc_fingerprint, page]
+        if config_fingerprint:
+            query += " AND config_fingerprint = ?"
+            params.append(config_fingerprint)
+        query += " ORDER BY created_at DESC LIMIT 1"
+        row = self.conn.execute(query, params).fetchone()
+        return dict(row) if row else None
+    
+    def get_document(self, doc_fingerprint: str,
+                     config_fingerprint: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Look up all page results of a document in page order.
+        
+        Args:
+            doc_fingerprint: Document content fingerprint
+            config_fingerprint: Restrict to one config if given
+            
+        Returns:
+            List of page result dicts
+        """
+        self.flush()
+        query = f"SELECT {_PAGE_COLUMNS} FROM pages WHERE doc_fingerprint = ?"
+        params: List[Any] = [doc_fingerprint]
+        if config_fingerprint:
+            query += " AND config_fingerprint = ?"
+            params.append(config_fingerprint)
+        query += " ORDER BY page, created_at DESC"
+        return [dict(row) for row in self.conn.execute(query, params)]
+    
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Full-text search over extracted page text.
+        
+        Args:
+            query: FTS5 query string
+            limit: Maximum number of hits
+            
+        Returns:
+            List of hits with document, page, config fingerprint, path and snippet,
+            best matches first
+        """
+        self.flush()
+        rows = self.conn.execute(
+            "SELECT p.doc_fingerprint, p.page, p.config_fingerprint, d.path, "
+            "snippet(pages_fts, 0, '[', ']', '...', 16) AS snippet "
+            "FROM pages_fts JOIN pages p ON p.id = pages_fts.rowid "
+            "LEFT JOIN documents d ON d.fingerprint = p.doc_fingerprint "
+            "WHERE pages_fts MATCH ? ORDER BY rank LIMIT ?",
+            (query, limit)
+        )
+        return [dict(row) for row in rows]
+    
+    def stats(self) -> Dict[str, int]:
+        """Return document and page counts."""
+        self.flush()
+        documents = self.conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        pages = self.conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+        errors = self.conn.execute(
+            "SELECT COUNT(*) FROM pages WHERE status != 'success'"
+        ).fetchone()[0]
+        return {'documents': documents, 'pages': pages, 'failed_pages': errors}
+    
+    def close(self) -> None:
+        """Flush pending writes and close the database."""
+        self.flush()
+        self.conn.close()
@@ -1,11 +1,13 @@
 """Utility functions for the PDF extractor package."""
 
+import hashlib
 import json
 import logging
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import Iterable, List, Dict, Any, Optional
 
 from .config import Config
+from .image_processor import ImageProcessor
 
 
 def setup_logging(level: str = "INFO") -> None:
@@ -66,3 +68,77 @@ def validate_file_path(file_path: str, extensions: List[str]) -> bool:
     """
     path = Path(file_path)
     return path.exists() and path.suffix.lower() in [ext.lower() for ext in extensions]
+
+
+def file_fingerprint(file_path: str, chunk_size: int = 1 << 20) -> str:
+    """Compute a content fingerprint (SHA-256 hex digest) of a file.
+    
+    Args:
+        file_path: Path to the file
+        chunk_size: Read size in bytes
+        
+    Returns:
+        Hex digest of the file contents
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sequence_fingerprint(file_paths: Iterable[str]) -> str:
+    """Compute a fingerprint for an ordered sequence of files.
+    
+    Args:
+        file_paths: Paths of the files, in page order
+        
+    Returns:
+        Hex digest over the content fingerprints of the files
+    """
+    digest = hashlib.sha256()
+    for file_path in file_paths:
+        digest.update(file_fingerprint(file_path).encode('ascii'))
+    return digest.hexdigest()
+
+
+def document_fingerprint(path: str) -> str:
+    """Compute the fingerprint of a document.
+    
+    Args:
+        path: PDF or image file, or a directory holding an image sequence
+        
+    Returns:
+        File fingerprint, or the sequence fingerprint of the directory's images
+    """
+    if Path(path).is_dir():
+        return sequence_fingerprint(ImageProcessor.list_image_files(path))
+    return file_fingerprint(path)
+
+
+def output_file_path(output_dir: str, index: int, path: str) -> str:
+    """Build the JSON result path of one document of a multi-document run.
+    
+    Args:
+        output_dir: Directory for the result files
+        index: Position of the document in the run
+        path: Document path
+        
+    Returns:
+        Result file path, unique even for documents with equal file names
+    """
+    return str(Path(output_dir) / f"{index:06d}_{Path(path).stem}.json")
+
+
+def read_manifest(manifest_path: str) -> List[str]:
+    """Read document paths from a manifest file.
+    
+    Args:
+        manifest_path: Text file with one path per line; blank lines and
+            lines starting with '#' are ignored
+        
+    Returns:
+        List of paths in file order
+    """
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
@@ -2,14 +2,32 @@
 Unit tests for the PDF extractor package.
 """
 
+import asyncio
+import threading
+import time
 import unittest
 from unittest.mock import Mock, patch, MagicMock
 from PIL import Image
+import fitz
+import io
+import json
+import multiprocessing
 import tempfile
 import os
+import torch
 
-from src.pdf_extractor import OCREngine, PDFProcessor, Config
-from src.pdf_extractor.utils import validate_file_path, setup_logging
+from src.pdf_extractor import OCREngine, PDFProcessor, ImageProcessor, Config, ResultStore
+from src.pdf_extractor import bench
+from src.pdf_extractor.batch import run_batch
+from src.pdf_extractor.job_queue import JobQueue, run_worker
+from src.pdf_extractor.memory import MemoryTracker, release_memory
+from src.pdf_extractor.pdf_processor import HybridPage
+from src.pdf_extractor.pipeline import extract_document
+from src.pdf_extractor.scheduler import LengthAwareScheduler, estimate_output_tokens, run_scheduled
+from src.pdf_extractor.utils import (
+    validate_file_path, setup_logging, file_fingerprint, sequence_fingerprint,
+    document_fingerprint, output_file_path, read_manifest
+)
 
 
 class TestConfig(unittest.TestCase):
@@ -43,6 +61,12 @@ class TestConfig(unittest.TestCase):
         self.assertIsInstance(config_dict, dict)
         self.assertIn('model_path', config_dict)
         self.assertIn('max_image_side', config_dict)
+    
+    def test_config_fingerprint(self):
+        """Test the fingerprint tracks result-affecting settings only."""
+        base = Config().fingerprint()
+        self.assertEqual(base, Config(device_map='cpu').fingerprint())
+        self.assertNotEqual(base, Config(dpi=200).fingerprint())
 
 
 class TestPDFProcessor(unittest.TestCase):
@@ -77,6 +101,83 @@ class TestPDFProcessor(unittest.TestCase):
         self.assertIsInstance(images[0], Image.Image)
         mock_fitz_open.assert_called_once_with("test.pdf")
     
+    def _write_scanned_pdf(self, rotation=0, with_text=False):
+        """Write a one-page PDF holding a single full-page JPEG."""
+        scan = Image.new('RGB', (400, 200), color='white')
+        scan.paste((255, 0, 0), (0, 0, 100, 50))
+        buf = io.BytesIO()
+        scan.save(buf, 'JPEG')
+        
+        doc = fitz.open()
+        page = doc.new_page(width=200, height=100)
+        page.insert_image(page.rect, stream=buf.getvalue())
+        if with_text:
+            page.insert_text((20, 80), "digital text")
+        page.set_rotation(rotation)
+        
+        tmp = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
+        tmp.close()
+        doc.save(tmp.name)
+        doc.close()
+        self.addCleanup(os.unlink, tmp.name)
+        return tmp.name
+    
+    def test_embedded_image_fast_path(self):
+        """Test single-image pages are extracted without rendering."""
+        pdf_path = self._write_scanned_pdf(rotation=90)
+        processor = PDFProcessor(Config(dpi=72))
+        
+        images = list(processor.pdf_to_images(pdf_path))
+        rendered = list(PDFProcessor(Config(dpi=72, extract_embedded_images=False))
+                        .pdf_to_images(pdf_path))
+        
+        self.assertEqual(processor.stats, {'pages': 1, 'fast_path_pages': 1})
+        self.assertEqual(images[0].mode, 'RGB')
+        self.assertEqual(images[0].size, rendered[0].size)
+        # The red marker ends up in the top-right corner after rotation
+        self.assertGreater(images[0].getpixel((90, 5))[0], 200)
+        self.assertLess(images[0].getpixel((90, 5))[1], 80)
+    
+    def test_embedded_image_non_square_pixels(self):
+        """Test a fax-like image with anisotropic placement keeps the page aspect ratio."""
+        # 204x98 dpi style: half the vertical resolution of the horizontal one
+        scan = Image.new('L', (170, 110), color=255)
+        scan.paste(0, (0, 0, 170, 55))
+        buf = io.BytesIO()
+        scan.save(buf, 'PNG')
+        doc = fitz.open()
+        page = doc.new_page(width=200, height=260)
+        page.insert_image(page.rect, stream=buf.getvalue(), keep_proportion=False)
+        tmp = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
+        tmp.close()
+        doc.save(tmp.name)
+        doc.close()
+        self.addCleanup(os.unlink, tmp.name)
+        
+        processor = PDFProcessor(Config(dpi=144))
+        image = list(processor.pdf_to_images(tmp.name))[0]
+        rendered = list(PDFProcessor(Config(dpi=144, extract_embedded_images=False))
+                        .pdf_to_images(tmp.name))[0]
+        
+        self.assertEqual(processor.stats['fast_path_pages'], 1)
+        self.assertEqual(rendered.size, (400, 520))
+        # Horizontal resolution kept, vertical axis stretched to the page shape
+        self.assertEqual(image.size, (170, 221))
+        self.assertAlmostEqual(image.width / image.height, rendered.width / rendered.height, places=2)
+        # The black upper half still covers the upper half of the page
+        self.assertLess(image.getpixel((85, 100))[0], 50)
+        self.assertGreater(image.getpixel((85, 120))[0], 200)
+    
+    def test_embedded_image_fallback_with_text(self):
+        """Test pages with visible text alongside the image are rendered."""
+        pdf_path = self._write_scanned_pdf(with_text=True)
+        processor = PDFProcessor(Config(dpi=72))
+        
+        images = list(processor.pdf_to_images(pdf_path))
+        
+        self.assertEqual(len(images), 1)
+        self.assertEqual(processor.stats, {'pages': 1, 'fast_path_pages': 0})
+    
     @patch('fitz.open')
     def test_extract_page_count(self, mock_fitz_open):
         """Test page count extraction."""
@@ -90,6 +191,52 @@ class TestPDFProcessor(unittest.TestCase):
         mock_fitz_open.assert_called_once_with("test.pdf")
 
 
+class TestImageProcessor(unittest.TestCase):
+    """Test cases for ImageProcessor class."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.processor = ImageProcessor(Config())
+    
+    def _write_tiff(self, name, colors):
+        path = os.path.join(self.tmpdir.name, name)
+        frames = [Image.new('L', (40, 30), color=c) for c in colors]
+        frames[0].save(path, save_all=True, append_images=frames[1:])
+        return path
+    
+    def test_multi_frame_tiff(self):
+        """Test frames of a multi-page TIFF are yielded lazily in order."""
+        path = self._write_tiff('fax.tiff', [0, 128, 255])
+        
+        self.assertEqual(self.processor.extract_frame_count(path), 3)
+        
+        frames = self.processor.image_to_frames(path)
+        first = next(frames)
+        self.assertEqual(self.processor.stats['pages'], 1)
+        self.assertEqual(first.mode, 'RGB')
+        self.assertEqual(first.getpixel((0, 0)), (0, 0, 0))
+        
+        rest = list(frames)
+        self.assertEqual([f.getpixel((0, 0))[0] for f in rest], [128, 255])
+        self.assertEqual(self.processor.stats['pages'], 3)
+    
+    def test_image_sequence(self):
+        """Test a directory of images is read as one page sequence."""
+        self._write_tiff('b.tif', [10, 20])
+        Image.new('RGB', (10, 10), color='red').save(os.path.join(self.tmpdir.name, 'a.png'))
+        with open(os.path.join(self.tmpdir.name, 'notes.txt'), 'w') as f:
+            f.write('ignored')
+        
+        files = self.processor.list_image_files(self.tmpdir.name)
+        self.assertEqual([os.path.basename(f) for f in files], ['a.png', 'b.tif'])
+        
+        frames = list(self.processor.sequence_to_frames(files))
+        self.assertEqual(len(frames), 3)
+        self.assertEqual(frames[0].getpixel((0, 0)), (255, 0, 0))
+
+
 class TestOCREngine(unittest.TestCase):
     """Test cases for OCREngine class."""
     
@@ -97,14 +244,14 @@ class TestOCREngine(unittest.TestCase):
         """Set up test fixtures."""
         self.config = Config()
     
+    @patch('src.pdf_extractor.ocr_engine.snapshot_download')
     @patch('src.pdf_extractor.ocr_engine.AutoModelForImageTextToText')
-    @patch('src.pdf_extractor.ocr_engine.AutoTokenizer')
     @patch('src.pdf_extractor.ocr_engine.AutoProcessor')
-    def test_ocr_engine_init(self, mock_processor, mock_tokenizer, mock_model):
+    def test_ocr_engine_init(self, mock_processor, mock_model, mock_snapshot):
         """Test OCR engine initialization."""
         # Mock the model components
+        mock_snapshot.return_value = '/cache/snapshot'
         mock_model.from_pretrained.return_value = MagicMock()
-        mock_tokenizer.from_pretrained.return_value = MagicMock()
         mock_processor.from_pretrained.return_value = MagicMock()
         
         engine = OCREngine(self.config)
@@ -112,6 +259,74 @@ class TestOCREngine(unittest.TestCase):
         self.assertIsNotNone(engine.model)
         self.assertIsNotNone(engine.tokenizer)
         self.assertIsNotNone(engine.processor)
+        
+        # The tokenizer is reused from the processor, loaded once from the snapshot
+        self.assertIs(engine.tokenizer, engine.processor.tokenizer)
+        mock_processor.from_pretrained.assert_called_once_with('/cache/snapshot')
+        mock_snapshot.assert_called_once_with(
+            self.config.model_path, revision=None, local_files_only=True
+        )
+        self.assertEqual(set(engine.load_timings), {'resolve', 'processor', 'model', 'total'})
+    
+    @patch('src.pdf_extractor.ocr_engine.snapshot_download')
+    def test_resolve_model_path(self, mock_snapshot):
+        """Test snapshot resolution is offline-first."""
+        from huggingface_hub.utils import LocalEntryNotFoundError
+        
+        with patch.object(OCREngine, '_load_model'):
+            engine = OCREngine(Config(model_revision='abc123'))
+        
+        mock_snapshot.side_effect = [LocalEntryNotFoundError('missing'), '/cache/new']
+        self.assertEqual(engine._resolve_model_path(), '/cache/new')
+        self.assertEqual(mock_snapshot.call_args.kwargs['revision'], 'abc123')
+        
+        engine.config = Config(local_files_only=True)
+        mock_snapshot.side_effect = LocalEntryNotFoundError('missing')
+        with self.assertRaises(LocalEntryNotFoundError):
+            engine._resolve_model_path()
+        
+        with tempfile.TemporaryDirectory() as model_dir:
+            engine.config = Config(model_path=model_dir)
+            self.assertEqual(engine._resolve_model_path(), model_dir)
+    
+    def test_compiled_generation_settings(self):
+        """Test compiled mode is CUDA-only, buckets images and requests a static cache."""
+        config = Config(compile_generation=True, image_size_buckets=[64, 128])
+        with patch.object(OCREngine, '_load_model'):
+            engine = OCREngine(config)
+        engine.model = MagicMock()
+        engine.model.device.type = 'cpu'
+        engine.tokenizer = MagicMock()
+        engine._setup_compiled_generation()
+        # No gain on CPU, so compiled mode stays off there
+        self.assertIsNone(engine._compile_config)
+        self.assertEqual(engine._bucket_image(Image.new('RGB', (50, 100))).size, (50, 100))
+        
+        engine.model.device.type = 'cuda'
+        engine._setup_compiled_generation()
+        padded = engine._bucket_image(Image.new('RGB', (50, 100), color='black'))
+        self.assertEqual(padded.size, (64, 128))
+        self.assertEqual(padded.getpixel((60, 120)), (255, 255, 255))
+        self.assertEqual(engine._bucket_image(Image.new('RGB', (64, 64))).size, (64, 64))
+        
+        engine._generate({'input_ids': None})
+        kwargs = engine.model.generate.call_args.kwargs
+        self.assertEqual(kwargs['cache_implementation'], 'static')
+        self.assertTrue(kwargs['compile_config'].fullgraph)
+    
+    @unittest.skipUnless(torch.cuda.is_available(), "compiled generation only applies on CUDA")
+    def test_compiled_generation_matches_eager(self):
+        """Test the compiled static-cache path generates the same tokens as eager mode."""
+        engine = bench.RandomModelEngine(Config(max_new_tokens=8, compile_generation=True))
+        self.addCleanup(engine.close)
+        inputs = engine.prompt_inputs(32)
+        
+        compiled = engine._generate(inputs, min_new_tokens=8)
+        compile_config, engine._compile_config = engine._compile_config, None
+        eager = engine._generate(inputs, min_new_tokens=8)
+        
+        self.assertIsNotNone(compile_config)
+        self.assertTrue(torch.equal(compiled, eager))
     
     def test_load_and_resize_image(self):
         """Test image loading and resizing."""
@@ -137,12 +352,873 @@ class TestOCREngine(unittest.TestCase):
                 img = engine.load_and_resize_image(test_img)
                 self.assertIsInstance(img, Image.Image)
                 self.assertEqual(img.mode, 'RGB')
+                
+                # Test large files are downsized to max_image_side
+                engine.config = Config(max_image_side=64)
+                Image.new('RGB', (400, 200), color='green').save(tmp_path)
+                img = engine.load_and_resize_image(tmp_path)
+                self.assertEqual(img.size, (64, 32))
         
         finally:
             # Clean up
             os.unlink(tmp_path)
 
 
+class TestTimeBudget(unittest.TestCase):
+    """Test cases for per-page time budgets and the degraded fallback."""
+    
+    def _make_engine(self, config, seconds_per_pixel_column):
+        """Engine whose fake generation time grows with image width."""
+        with patch.object(OCREngine, '_load_model'):
+            engine = OCREngine(config)
+        engine.model = MagicMock()
+        engine.calls = []
+        
+        def fake_generate(image, stopping_criteria=None, **overrides):
+            engine.calls.append((image.width, overrides))
+            needed = image.width * seconds_per_pixel_column
+            time.sleep(min(needed, overrides.get('max_time', needed)))
+            return f"text@{image.width}"
+        
+        engine._preprocess = lambda image, prompt: image
+        engine._to_device = lambda inputs: inputs
+        engine._generate = fake_generate
+        engine._decode = lambda output, inputs: [output]
+        return engine
+    
+    def test_no_budget(self):
+        """Test pages run unbounded when no budget is configured."""
+        engine = self._make_engine(Config(), 0.0)
+        result = engine.extract_page(Image.new('RGB', (100, 100)))
+        
+        self.assertEqual(result['text'], 'text@100')
+        self.assertFalse(result['budget_exceeded'])
+        self.assertIsNone(result['fallback'])
+        self.assertNotIn('max_time', engine.calls[0][1])
+    
+    def test_budget_exceeded_with_fallback(self):
+        """Test a slow page is cut off and retried at reduced quality."""
+        config = Config(page_time_budget=0.1, fallback_image_scale=0.1,
+                        fallback_max_new_tokens=64)
+        engine = self._make_engine(config, 0.005)
+        result = engine.extract_page(Image.new('RGB', (100, 100)))
+        
+        self.assertTrue(result['budget_exceeded'])
+        self.assertEqual(result['fallback'], 'reduced')
+        self.assertFalse(result['truncated'])
+        self.assertEqual(result['text'], 'text@10')
+        self.assertEqual(engine.calls[1][1]['max_new_tokens'], 64)
+        self.assertLess(result['elapsed'], 0.5)
+    
+    def test_budget_exceeded_without_retry(self):
+        """Test the partial text is kept when retries are disabled."""
+        config = Config(page_time_budget=0.05, budget_retry=False)
+        engine = self._make_engine(config, 0.005)
+        result = engine.extract_page(Image.new('RGB', (100, 100)))
+        
+        self.assertTrue(result['truncated'])
+        self.assertIsNone(result['fallback'])
+        self.assertEqual(len(engine.calls), 1)
+    
+    def test_document_deadline_caps_page_budget(self):
+        """Test an earlier document deadline overrides the page budget."""
+        engine = self._make_engine(Config(page_time_budget=10), 0.005)
+        result = engine.extract_page(Image.new('RGB', (100, 100)),
+                                     deadline=time.monotonic() + 0.05)
+        
+        self.assertTrue(result['budget_exceeded'])
+        self.assertIsNone(result['fallback'])
+        self.assertLessEqual(engine.calls[0][1]['max_time'], 0.05)
+    
+    def test_expired_document_stops_reading_pages(self):
+        """Test pages past the document deadline are skipped without being read."""
+        config = Config(document_time_budget=0, preprocess_prefetch=2)
+        engine = bench.FakeOCREngine(config)
+        self.addCleanup(engine.close)
+        pulled = []
+        
+        def pages():
+            for i in range(30):
+                pulled.append(i)
+                yield Image.new('RGB', (28, 28))
+        
+        results = list(extract_document(engine, pages(), config, page_count=30))
+        
+        self.assertEqual([r['page'] for r in results], list(range(1, 31)))
+        self.assertTrue(all(r['status'] == 'skipped' for r in results))
+        self.assertLessEqual(len(pulled), 4)
+
+
+class TestPreprocessPipeline(unittest.TestCase):
+    """Test cases for running preprocessing ahead of inference."""
+    
+    def _make_engine(self, config):
+        with patch.object(OCREngine, '_load_model'):
+            engine = OCREngine(config)
+        self.addCleanup(engine.close)
+        engine.model = MagicMock()
+        engine.events = []
+        
+        def fake_preprocess(image, prompt):
+            if image.width == 13:
+                raise ValueError("bad page")
+            engine.events.append(('preprocess', image.width, threading.current_thread().name))
+            return image
+        
+        def fake_generate(inputs, stopping_criteria=None, **overrides):
+            engine.events.append(('generate', inputs.width, threading.current_thread().name))
+            time.sleep(0.02)
+            return f"text@{inputs.width}"
+        
+        engine._preprocess = fake_preprocess
+        engine._to_device = lambda inputs: inputs
+        engine._generate = fake_generate
+        engine._decode = lambda output, inputs: [output]
+        return engine
+    
+    def test_results_in_order_with_prefetch(self):
+        """Test pages are preprocessed ahead on workers and returned in order."""
+        engine = self._make_engine(Config(preprocess_workers=2, preprocess_prefetch=3))
+        images = (Image.new('RGB', (w, 10)) for w in (10, 11, 12, 13, 14))
+        
+        results = list(engine.iter_extract_pages(images))
+        
+        self.assertEqual([r['status'] for r in results],
+                         ['success', 'success', 'success', 'error', 'success'])
+        self.assertEqual(results[2]['text'], 'text@12')
+        self.assertEqual(results[3]['error'], 'bad page')
+        
+        preprocess_threads = {t for kind, _, t in engine.events if kind == 'preprocess'}
+        self.assertTrue(all(t.startswith('ocr-preprocess') for t in preprocess_threads))
+        order = [(kind, w) for kind, w, _ in engine.events]
+        self.assertLess(order.index(('preprocess', 11)), order.index(('generate', 11)))
+    
+    def test_inline_preprocessing_and_deadline(self):
+        """Test the inline mode and skipping pages past the deadline."""
+        engine = self._make_engine(Config(preprocess_workers=0))
+        images = [Image.new('RGB', (w, 10)) for w in (10, 11)]
+        
+        results = list(engine.iter_extract_pages(images, deadline=time.monotonic() - 1))
+        
+        self.assertEqual([r['status'] for r in results], ['skipped', 'skipped'])
+        threads = {t for _, _, t in engine.events}
+        self.assertEqual(threads, {threading.current_thread().name})
+    
+    def test_early_stop_closes_source(self):
+        """Test abandoning the stream stops the feeder and closes the source."""
+        engine = self._make_engine(Config(preprocess_workers=1, preprocess_prefetch=1))
+        closed = threading.Event()
+        
+        def pages():
+            try:
+                for w in range(10, 100):
+                    yield Image.new('RGB', (w, 10))
+            finally:
+                closed.set()
+        
+        stream = engine.iter_extract_pages(pages())
+        self.assertEqual(next(stream)['text'], 'text@10')
+        stream.close()
+        
+        self.assertTrue(closed.wait(5))
+    
+    def test_mupdf_store_shrunk_on_rendering_thread(self):
+        """Test periodic MuPDF store shrinks run on the feeder, not the consumer."""
+        config = Config(dpi=36, memory_release_interval=2)
+        engine = self._make_engine(config)
+        doc = fitz.open()
+        for _ in range(4):
+            doc.new_page(width=100, height=100)
+        tmp = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
+        tmp.close()
+        doc.save(tmp.name)
+        doc.close()
+        self.addCleanup(os.unlink, tmp.name)
+        shrink_threads = []
+        
+        with patch('fitz.TOOLS.store_shrink',
+                   side_effect=lambda pct: shrink_threads.append(threading.current_thread().name)):
+            pages = PDFProcessor(config).pdf_to_images(tmp.name)
+            results = list(extract_document(engine, pages, config))
+        
+        self.assertEqual(len(results), 4)
+        self.assertEqual(shrink_threads, ['ocr-feeder', 'ocr-feeder'])
+
+
+class TestHybridExtraction(unittest.TestCase):
+    """Test cases for hybrid text layer + region OCR extraction."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.config = Config(dpi=72, max_new_tokens=4, hybrid_extraction=True)
+        
+        figure = io.BytesIO()
+        Image.new('RGB', (200, 100), color='red').save(figure, 'PNG')
+        doc = fitz.open()
+        # Mixed page: text, a figure, a vector chart, more text
+        page = doc.new_page(width=300, height=400)
+        page.insert_text((20, 30), "Quarterly report with plenty of native text in the layer.")
+        page.insert_image(fitz.Rect(50, 100, 250, 200), stream=figure.getvalue())
+        page.draw_rect(fitz.Rect(50, 250, 150, 300), color=(0, 0, 1), fill=(0, 1, 0))
+        page.insert_text((20, 380), "Closing paragraph below the figures, also native text.")
+        # Text-only page
+        doc.new_page(width=300, height=400).insert_text((20, 30), "Only text on this page. " * 4)
+        # Scanned page
+        doc.new_page(width=300, height=400).insert_image(fitz.Rect(0, 0, 300, 400),
+                                                         stream=figure.getvalue())
+        self.tmp = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
+        self.tmp.close()
+        doc.save(self.tmp.name)
+        doc.close()
+        self.addCleanup(os.unlink, self.tmp.name)
+    
+    def test_page_analysis(self):
+        """Test mixed pages are split and other pages fall back to full images."""
+        processor = PDFProcessor(self.config)
+        
+        pages = list(processor.pdf_to_hybrid_pages(self.tmp.name))
+        
+        self.assertIsInstance(pages[0], HybridPage)
+        kinds = ['image' if s.image is not None else 'text' for s in pages[0].segments]
+        self.assertEqual(kinds, ['text', 'image', 'image', 'text'])
+        self.assertEqual(pages[0].images[0].size, (204, 104))
+        self.assertEqual(pages[0].merge(['FIGURE', 'CHART']).split('\n\n')[1:3], ['FIGURE', 'CHART'])
+        self.assertEqual(pages[1].images, [])
+        self.assertIsInstance(pages[2], Image.Image)
+        self.assertEqual(processor.stats['hybrid_pages'], 2)
+    
+    def test_two_column_reading_order(self):
+        """Test columns are read one after the other with the figure in its column."""
+        figure = io.BytesIO()
+        Image.new('RGB', (100, 60), color='red').save(figure, 'PNG')
+        doc = fitz.open()
+        page = doc.new_page(width=600, height=500)
+        for i in range(4):
+            y = 40 + i * 100 + (80 if i >= 2 else 0)
+            page.insert_text((40, y), f"LEFT{i} first column paragraph text")
+        page.insert_image(fitz.Rect(40, 220, 240, 300), stream=figure.getvalue())
+        for i in range(4):
+            page.insert_text((340, 40 + i * 120), f"RIGHT{i} second column paragraph text")
+        tmp = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
+        tmp.close()
+        doc.save(tmp.name)
+        doc.close()
+        self.addCleanup(os.unlink, tmp.name)
+        
+        page = list(PDFProcessor(self.config).pdf_to_hybrid_pages(tmp.name))[0]
+        labels = [part.split()[0] for part in page.merge(['FIGURE']).split('\n\n')]
+        
+        self.assertEqual(labels, ['LEFT0', 'LEFT1', 'FIGURE', 'LEFT2', 'LEFT3',
+                                  'RIGHT0', 'RIGHT1', 'RIGHT2', 'RIGHT3'])
+    
+    def test_extract_document_merges_in_page_order(self):
+        """Test only regions are OCR'd, in one batch, and pages stay in order."""
+        engine = bench.FakeOCREngine(self.config)
+        self.addCleanup(engine.close)
+        pages = PDFProcessor(self.config).pdf_to_hybrid_pages(self.tmp.name)
+        
+        with patch.object(engine, 'extract_batch', wraps=engine.extract_batch) as extract_batch:
+            results = list(extract_document(engine, pages, self.config))
+        
+        self.assertEqual([r['page'] for r in results], [1, 2, 3])
+        self.assertEqual([r.get('ocr_regions') for r in results], [2, 0, None])
+        extract_batch.assert_called_once()
+        self.assertTrue(results[0]['text'].startswith('Quarterly report'))
+        self.assertTrue(results[0]['text'].endswith('also native text.'))
+        self.assertTrue(results[1]['text'].startswith('Only text on this page.'))
+        self.assertEqual(results[2]['status'], 'success')
+    
+    def test_hybrid_pages_share_bounded_read_ahead(self):
+        """Test hybrid pages are not read ahead beyond the prefetch bound."""
+        config = Config.from_dict({**self.config.to_dict(), 'preprocess_prefetch': 2})
+        engine = bench.FakeOCREngine(config)
+        self.addCleanup(engine.close)
+        hybrid = list(PDFProcessor(config).pdf_to_hybrid_pages(self.tmp.name))[0]
+        pulled = []
+        
+        def pages():
+            for i in range(40):
+                pulled.append(i)
+                yield hybrid
+        
+        results = extract_document(engine, pages(), config)
+        first = next(results)
+        
+        self.assertEqual(first['ocr_regions'], 2)
+        # Two queued, one being handed over by the feeder, one being extracted
+        self.assertLessEqual(len(pulled), 5)
+        self.assertEqual(len(list(results)), 39)
+    
+    def test_extract_batch(self):
+        """Test batched extraction returns one text per image in order."""
+        engine = bench.FakeOCREngine(Config(max_new_tokens=4, batch_size=2))
+        self.addCleanup(engine.close)
+        images = [Image.new('RGB', (28 * (i + 1), 28)) for i in range(3)]
+        
+        batch = engine.extract_batch(images)
+        
+        self.assertEqual(len(batch['texts']), 3)
+        self.assertEqual(batch['texts'], [engine.extract_text(image) for image in images])
+        self.assertFalse(batch['truncated'])
+
+
+class TestMultiPrompt(unittest.TestCase):
+    """Test cases for several prompts per page with one image encode."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.config = Config(max_new_tokens=6)
+        self.engine = bench.FakeOCREngine(self.config)
+        self.addCleanup(self.engine.close)
+        self.image = Image.new('RGB', (56, 56), color='white')
+        self.prompts = {
+            'text': 'Extract all text.',
+            'tables': 'Extract only the tables as HTML.',
+            'fields': 'List the key value pairs.',
+        }
+    
+    def test_prompts_share_image_encode(self):
+        """Test each prompt gets its own output while the image is encoded once."""
+        outputs = self.engine.extract_prompts(self.image, self.prompts)
+        
+        self.assertEqual(self.engine.model.vision_encodes, 1)
+        self.assertEqual(set(outputs), set(self.prompts))
+        for name, prompt in self.prompts.items():
+            engine = bench.FakeOCREngine(Config(max_new_tokens=6, ocr_prompt=prompt))
+            self.assertEqual(outputs[name], engine.extract_text(self.image))
+        self.assertEqual(len(set(outputs.values())), 3)
+    
+    def test_prompt_list_and_single_prompt(self):
+        """Test list input is keyed by prompt and a single prompt runs directly."""
+        prompts = list(self.prompts.values())
+        
+        outputs = self.engine.extract_prompts(self.image, prompts + prompts[:1])
+        single = self.engine.extract_prompts(self.image, prompts[:1])
+        
+        self.assertEqual(list(outputs), prompts)
+        self.assertEqual(single, {prompts[0]: outputs[prompts[0]]})
+        self.assertEqual(self.engine.model.vision_encodes, 2)
+    
+    def test_prefix_prefill_keeps_last_logits_only(self):
+        """Test the shared prefill skips the LM head for the image positions."""
+        model = self.engine.model
+        with patch.object(self.engine, 'model', MagicMock(wraps=model)) as wrapped:
+            wrapped.device = model.device
+            self.engine.extract_prompts(self.image, self.prompts)
+        
+        self.assertEqual(wrapped.call_args.kwargs['logits_to_keep'], 1)
+    
+    def test_empty_prompts(self):
+        """Test an empty prompt collection is rejected."""
+        for prompts in ({}, []):
+            with self.assertRaises(ValueError):
+                self.engine.extract_prompts(self.image, prompts)
+
+
+class TestAsyncAPI(unittest.IsolatedAsyncioTestCase):
+    """Test cases for the async OCREngine and PDFProcessor API."""
+    
+    def _make_engine(self, config):
+        with patch.object(OCREngine, '_load_model'):
+            engine = OCREngine(config)
+        self.addCleanup(engine.close)
+        return engine
+    
+    async def test_aextract_text_bounded_concurrency(self):
+        """Test concurrent callers are bounded by inference_concurrency."""
+        engine = self._make_engine(Config(inference_concurrency=2))
+        lock = threading.Lock()
+        active = []
+        peak = []
+        
+        def fake_extract(image_input, cancel_event=None):
+            with lock:
+                active.append(image_input)
+                peak.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.remove(image_input)
+            return f"text-{image_input}"
+        
+        engine._extract_text = fake_extract
+        texts = await asyncio.gather(*(engine.aextract_text(f"p{i}") for i in range(6)))
+        
+        self.assertEqual(texts, [f"text-p{i}" for i in range(6)])
+        self.assertEqual(max(peak), 2)
+    
+    async def test_generation_is_serialized(self):
+        """Test concurrent pages never run model.generate at the same time."""
+        engine = bench.FakeOCREngine(Config(max_new_tokens=4, inference_concurrency=3))
+        self.addCleanup(engine.close)
+        generate = engine.model.generate
+        active = []
+        peak = []
+        
+        def tracked_generate(*args, **kwargs):
+            active.append(1)
+            peak.append(len(active))
+            time.sleep(0.02)
+            try:
+                return generate(*args, **kwargs)
+            finally:
+                active.pop()
+        
+        engine.model.generate = tracked_generate
+        images = [Image.new('RGB', (28 * (i + 1), 28)) for i in range(6)]
+        texts = await asyncio.gather(*(engine.aextract_text(image) for image in images))
+        
+        self.assertEqual(len(texts), 6)
+        self.assertEqual(max(peak), 1)
+    
+    async def test_aextract_text_cancellation(self):
+        """Test cancelling a caller signals the running generation to stop."""
+        engine = self._make_engine(Config())
+        started = threading.Event()
+        events = []
+        
+        def fake_extract(image_input, cancel_event=None):
+            events.append(cancel_event)
+            started.set()
+            cancel_event.wait(5)
+            return ""
+        
+        engine._extract_text = fake_extract
+        task = asyncio.ensure_future(engine.aextract_text("page"))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        task.cancel()
+        
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertTrue(events[0].is_set())
+    
+    async def test_apdf_to_images(self):
+        """Test asynchronous page iteration over a real PDF."""
+        doc = fitz.open()
+        for _ in range(3):
+            doc.new_page(width=72, height=72)
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp:
+            pdf_path = tmp.name
+        doc.save(pdf_path)
+        doc.close()
+        self.addCleanup(os.unlink, pdf_path)
+        
+        processor = PDFProcessor(Config(dpi=72))
+        self.addCleanup(processor.close)
+        images = [img async for img in processor.apdf_to_images(pdf_path)]
+        
+        self.assertEqual(len(images), 3)
+        self.assertEqual(images[0].size, (72, 72))
+
+    async def test_concurrent_apdf_to_images_render_serially(self):
+        """Test two concurrent async iterators never render in MuPDF at once."""
+        paths = []
+        for _ in range(2):
+            doc = fitz.open()
+            for _ in range(4):
+                doc.new_page(width=72, height=72)
+            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp:
+                paths.append(tmp.name)
+            doc.save(paths[-1])
+            doc.close()
+            self.addCleanup(os.unlink, paths[-1])
+        
+        processor = PDFProcessor(Config(dpi=72, extract_embedded_images=False))
+        self.addCleanup(processor.close)
+        render = processor._page_to_image
+        lock = threading.Lock()
+        active = [0]
+        overlap = []
+        
+        def tracked_render(*args):
+            with lock:
+                active[0] += 1
+                overlap.append(active[0])
+            time.sleep(0.01)
+            try:
+                return render(*args)
+            finally:
+                with lock:
+                    active[0] -= 1
+        
+        processor._page_to_image = tracked_render
+        
+        async def collect(path):
+            return [img async for img in processor.apdf_to_images(path)]
+        
+        first, second = await asyncio.gather(collect(paths[0]), collect(paths[1]))
+        
+        self.assertEqual((len(first), len(second)), (4, 4))
+        self.assertEqual(len(overlap), 8)
+        self.assertEqual(max(overlap), 1)
+
+
+class TestResultStore(unittest.TestCase):
+    """Test cases for ResultStore class."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.db_path = os.path.join(self.tmpdir.name, 'results.db')
+    
+    def test_add_and_lookup(self):
+        """Test batched writes and page/document lookups."""
+        with ResultStore(self.db_path, batch_size=2) as store:
+            store.add_results('doc1', 'cfg1', [
+                {'page': 1, 'text': 'Invoice number 42', 'status': 'success'},
+                {'page': 2, 'text': '', 'status': 'error', 'error': 'boom'},
+                {'page': 3, 'text': 'Total amount due', 'status': 'success'},
+            ], path='invoice.pdf')
+        
+        with ResultStore(self.db_path) as store:
+            self.assertEqual(store.get_page('doc1', 1)['text'], 'Invoice number 42')
+            self.assertIsNone(store.get_page('doc1', 4))
+            self.assertEqual([r['page'] for r in store.get_document('doc1')], [1, 2, 3])
+            self.assertEqual(store.resolve_document('invoice.pdf'), 'doc1')
+            self.assertEqual(store.stats(), {'documents': 1, 'pages': 3, 'failed_pages': 1})
+    
+    def test_search_and_upsert(self):
+        """Test full-text search follows re-extracted text."""
+        with ResultStore(self.db_path) as store:
+            store.add_result('doc1', 'cfg1', {'page': 1, 'text': 'quarterly revenue table'})
+            hits = store.search('revenue')
+            self.assertEqual(len(hits), 1)
+            self.assertEqual(hits[0]['page'], 1)
+            
+            store.add_result('doc1', 'cfg1', {'page': 1, 'text': 'annual report'})
+            self.assertEqual(store.search('revenue'), [])
+            self.assertEqual(len(store.search('annual')), 1)
+            self.assertEqual(store.stats()['pages'], 1)
+
+
+class TestBatch(unittest.TestCase):
+    """Test cases for long-run batch mode and memory tracking."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.paths = []
+        for i in range(3):
+            doc = fitz.open()
+            for _ in range(i + 1):
+                doc.new_page(width=72, height=72).insert_text((10, 30), f"doc {i}")
+            path = os.path.join(self.tmpdir.name, f"doc{i}.pdf")
+            doc.save(path)
+            doc.close()
+            self.paths.append(path)
+        self.config = Config(dpi=72, max_new_tokens=4, memory_release_interval=1,
+                             release_page_images=True)
+    
+    def test_memory_tracker(self):
+        """Test per-document RSS deltas are reported."""
+        tracker = MemoryTracker()
+        tracker.start()
+        self.assertGreater(release_memory(), 0)
+        record = tracker.stop()
+        
+        self.assertEqual(set(record), {'rss_before_mb', 'rss_after_mb', 'rss_delta_mb'})
+        self.assertAlmostEqual(record['rss_delta_mb'],
+                               record['rss_after_mb'] - record['rss_before_mb'], places=0)
+    
+    def test_run_batch_in_process(self):
+        """Test documents are extracted with per-document results and memory records."""
+        output_dir = os.path.join(self.tmpdir.name, 'out')
+        store_path = os.path.join(self.tmpdir.name, 'results.db')
+        
+        records = run_batch(self.paths, self.config, output_dir, store_path,
+                            use_subprocess=False, engine_cls=bench.FakeOCREngine)
+        
+        self.assertEqual([r['pages'] for r in records], [1, 2, 3])
+        self.assertTrue(all(r['status'] == 'success' for r in records))
+        self.assertIn('rss_delta_mb', records[0])
+        self.assertTrue(os.path.exists(os.path.join(output_dir, 'batch_summary.json')))
+        self.assertTrue(os.path.exists(os.path.join(output_dir, '000002_doc2.json')))
+        with ResultStore(store_path) as store:
+            self.assertEqual(store.stats()['pages'], 6)
+    
+    def test_run_batch_in_process_never_recycles(self):
+        """Test in-process runs load the model once despite recycle limits."""
+        config = Config.from_dict({**self.config.to_dict(), 'worker_recycle_pages': 1})
+        
+        with patch.object(bench.FakeOCREngine, '_load_model',
+                          autospec=True, side_effect=bench.FakeOCREngine._load_model) as load:
+            records = run_batch(self.paths, config, use_subprocess=False,
+                                engine_cls=bench.FakeOCREngine)
+        
+        self.assertEqual([r['status'] for r in records], ['success'] * 3)
+        self.assertEqual(load.call_count, 1)
+    
+    def test_run_batch_recycles_workers(self):
+        """Test worker processes are replaced after the page limit."""
+        config = Config.from_dict({**self.config.to_dict(), 'worker_recycle_pages': 2})
+        
+        records = run_batch(self.paths, config, engine_cls=bench.FakeOCREngine)
+        
+        self.assertEqual([r['status'] for r in records], ['success'] * 3)
+        pids = [r['worker_pid'] for r in records]
+        # doc0 (1 page) + doc1 (2 pages) reach the limit, doc2 runs in a new worker
+        self.assertEqual(pids[0], pids[1])
+        self.assertNotEqual(pids[1], pids[2])
+        self.assertNotIn(os.getpid(), pids)
+    
+    def test_run_batch_aborts_when_worker_cannot_start(self):
+        """Test a worker that fails to load the model is not respawned per document."""
+        config = Config.from_dict({**self.config.to_dict(), 'model_path': '/nonexistent/model'})
+        
+        with self.assertRaises(RuntimeError):
+            run_batch(self.paths, config)
+
+
+class TestJobQueue(unittest.TestCase):
+    """Test cases for the distributed job queue."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.paths = []
+        for i in range(3):
+            doc = fitz.open()
+            for _ in range(i + 2):
+                doc.new_page(width=72, height=72).insert_text((10, 30), f"doc {i}")
+            path = os.path.join(self.tmpdir.name, f"doc{i}.pdf")
+            doc.save(path)
+            doc.close()
+            self.paths.append(path)
+        self.queue_path = os.path.join(self.tmpdir.name, 'queue.db')
+        self.config = Config(dpi=72, max_new_tokens=4, job_claim_batch=2)
+    
+    def test_add_documents_is_idempotent(self):
+        """Test re-submitting a manifest does not duplicate items."""
+        with JobQueue(self.queue_path) as job_queue:
+            self.assertEqual(job_queue.add_documents(self.paths, self.config), 9)
+            self.assertEqual(job_queue.add_documents(self.paths, self.config), 0)
+            self.assertEqual(job_queue.counts()['pending'], 9)
+    
+    def test_expired_lease_is_reclaimed(self):
+        """Test an expired lease goes to another worker and the stale result is rejected."""
+        with JobQueue(self.queue_path, lease_seconds=0.05) as job_queue:
+            job_queue.add_documents(self.paths[:1], self.config)
+            first = job_queue.claim('a', limit=1)[0]
+            self.assertEqual(job_queue.claim('b', limit=2)[0]['page'], 2)
+            time.sleep(0.1)
+            
+            second = job_queue.claim('b', limit=1)[0]
+            self.assertEqual((second['id'], second['attempts']), (first['id'], 2))
+            self.assertFalse(job_queue.complete(first['id'], 'a', {'text': 'stale'}))
+            self.assertTrue(job_queue.complete(second['id'], 'b', {'text': 'fresh'}))
+            self.assertEqual(job_queue.document_results()[self.paths[0]][0]['text'], 'fresh')
+    
+    def test_failed_items_retry_until_max_attempts(self):
+        """Test failures are requeued and then marked failed."""
+        with JobQueue(self.queue_path, max_attempts=2) as job_queue:
+            job_queue.add_documents(self.paths[:1], self.config)
+            for _ in range(2):
+                item = job_queue.claim('a', limit=1)[0]
+                self.assertEqual(item['page'], 1)
+                job_queue.fail(item['id'], 'a', 'boom')
+            
+            self.assertEqual(job_queue.counts()['failed'], 1)
+            self.assertEqual(job_queue.claim('a', limit=1)[0]['page'], 2)
+    
+    def test_lease_kept_while_page_generates(self):
+        """Test a page slower than the lease is not reclaimed while it generates."""
+        with JobQueue(self.queue_path) as job_queue:
+            job_queue.add_documents(self.paths[:1], self.config)
+        config = Config.from_dict({**self.config.to_dict(), 'job_lease_seconds': 0.3})
+        
+        class SlowEngine(bench.FakeOCREngine):
+            def _extract_page(self, *args, **kwargs):
+                time.sleep(1.0)
+                return super()._extract_page(*args, **kwargs)
+        
+        completed = []
+        worker = threading.Thread(target=lambda: completed.append(run_worker(
+            self.queue_path, config, 'a', poll_interval=0.05, engine_cls=SlowEngine)))
+        worker.start()
+        stolen = []
+        with JobQueue(self.queue_path, lease_seconds=0.3) as job_queue:
+            while job_queue.counts()['leased'] < 2 and worker.is_alive():
+                time.sleep(0.01)
+            while worker.is_alive():
+                stolen.extend(job_queue.claim('thief', limit=2))
+                time.sleep(0.05)
+            worker.join()
+            
+            self.assertEqual(stolen, [])
+            self.assertEqual(completed, [2])
+            self.assertEqual(job_queue.counts()['done'], 2)
+            results = job_queue.document_results()[self.paths[0]]
+            self.assertTrue(all(r['attempt'] == 1 for r in results))
+    
+    def test_workers_complete_every_item_once(self):
+        """Test concurrent worker processes share the queue without duplicates."""
+        with JobQueue(self.queue_path) as job_queue:
+            job_queue.add_documents(self.paths, self.config)
+        store_path = os.path.join(self.tmpdir.name, 'results.db')
+        
+        ctx = multiprocessing.get_context("spawn")
+        workers = [
+            ctx.Process(target=run_worker, args=(self.queue_path, self.config, f"w{i}", store_path),
+                        kwargs={'poll_interval': 0.1, 'engine_cls': bench.FakeOCREngine})
+            for i in range(3)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=120)
+            self.assertEqual(worker.exitcode, 0)
+        
+        with JobQueue(self.queue_path) as job_queue:
+            self.assertEqual(job_queue.counts(), {'pending': 0, 'leased': 0, 'done': 9, 'failed': 0})
+            results = job_queue.document_results()
+            self.assertEqual([len(results[path]) for path in self.paths], [2, 3, 4])
+            self.assertTrue(all(r['attempt'] == 1 for pages in results.values() for r in pages))
+        with ResultStore(store_path) as store:
+            self.assertEqual(store.stats()['pages'], 9)
+            # Workers share the store with a rollback journal, and reopening
+            # it for queries must not switch it to WAL
+            self.assertEqual(store.conn.execute("PRAGMA journal_mode").fetchone()[0], 'delete')
+        self.assertFalse(os.path.exists(store_path + '-wal'))
+
+
+class TestScheduler(unittest.TestCase):
+    """Test cases for length-aware batch scheduling."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        # Two scanned documents whose pages alternate between sparse and dense
+        self.paths = []
+        for i in range(2):
+            doc = fitz.open()
+            for ink in (5, 60, 10, 70, 0, 80):
+                page = doc.new_page(width=100, height=100)
+                if ink:
+                    page.draw_rect(fitz.Rect(0, 0, 100, ink + i), fill=(0, 0, 0))
+            path = os.path.join(self.tmpdir.name, f"doc{i}.pdf")
+            doc.save(path)
+            doc.close()
+            self.paths.append(path)
+        self.config = Config(dpi=72, max_new_tokens=4, batch_size=2, schedule_window=12)
+    
+    def _stub_engine(self):
+        """Engine whose outputs are as long as the ink estimate of their image."""
+        engine = Mock()
+        engine.batches = []
+        
+        def extract_batch(images, deadline=None):
+            tokens = [estimate_output_tokens(image, dpi=72) for image in images]
+            engine.batches.append(tokens)
+            return {'texts': [f"{n} tokens" for n in tokens], 'tokens': tokens,
+                    'elapsed': 0.01 * max(tokens), 'truncated': False}
+        
+        engine.extract_batch = extract_batch
+        return engine
+    
+    def test_estimate_output_tokens(self):
+        """Test estimates grow with the text layer and with ink."""
+        blank = Image.new('RGB', (200, 200), 'white')
+        half = blank.copy()
+        half.paste((0, 0, 0), (0, 0, 200, 100))
+        
+        self.assertEqual(estimate_output_tokens(blank, text_chars=400), 100)
+        self.assertEqual(estimate_output_tokens(blank), 1)
+        self.assertGreater(estimate_output_tokens(half, dpi=72), estimate_output_tokens(half))
+        self.assertGreater(estimate_output_tokens(half), estimate_output_tokens(blank))
+    
+    def test_grouping_reduces_padding(self):
+        """Test similar-length pages share batches and results keep page order."""
+        sorted_engine, baseline_engine = self._stub_engine(), self._stub_engine()
+        scheduled = LengthAwareScheduler(sorted_engine, self.config)
+        baseline = LengthAwareScheduler(baseline_engine, self.config, sort_by_length=False)
+        
+        records = list(scheduled.run(self.paths))
+        list(baseline.run(self.paths))
+        
+        self.assertEqual([r['path'] for r in records], self.paths)
+        for record in records:
+            self.assertEqual([p['page'] for p in record['pages']], [1, 2, 3, 4, 5, 6])
+        tokens = [int(p['text'].split()[0]) for p in records[0]['pages']]
+        self.assertEqual(tokens[1::2], sorted(tokens[1::2]))
+        self.assertLess(max(tokens[::2]), min(tokens[1::2]))
+        
+        self.assertEqual(scheduled.stats['generated_tokens'], baseline.stats['generated_tokens'])
+        self.assertGreater(scheduled.stats['padding_efficiency'],
+                           baseline.stats['padding_efficiency'] + 0.2)
+        self.assertGreater(scheduled.stats['tokens_per_second'],
+                           baseline.stats['tokens_per_second'])
+        self.assertTrue(all(max(b) - min(b) < 15 for b in sorted_engine.batches))
+    
+    def test_run_scheduled(self):
+        """Test scheduled extraction writes per-document results and a summary."""
+        output_dir = os.path.join(self.tmpdir.name, 'out')
+        config = Config.from_dict({**self.config.to_dict(), 'schedule_window': 5})
+        
+        summary = run_scheduled(self.paths, config, output_dir, engine_cls=bench.FakeOCREngine)
+        
+        self.assertEqual([r['pages'] for r in summary['documents']], [6, 6])
+        # Windows of 5, 5 and 2 pages
+        self.assertEqual(summary['stats']['batches'], 7)
+        with open(os.path.join(output_dir, '000001_doc1.json')) as f:
+            pages = json.load(f)
+        engine = bench.FakeOCREngine(config)
+        self.addCleanup(engine.close)
+        expected = [engine.extract_text(image)
+                    for image in PDFProcessor(config).pdf_to_images(self.paths[1])]
+        self.assertEqual([p['text'] for p in pages], expected)
+        self.assertTrue(os.path.exists(os.path.join(output_dir, 'batch_summary.json')))
+
+
+class TestBench(unittest.TestCase):
+    """Test cases for the benchmark suite."""
+    
+    def test_generate_synthetic_pdfs(self):
+        """Test every case is written with the expected page layout."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = bench.generate_synthetic_pdfs(tmpdir, pages=2)
+            self.assertEqual(set(paths), set(bench.CASES))
+            
+            processor = PDFProcessor(Config(dpi=36))
+            self.assertEqual(processor.extract_page_count(paths['huge_page']), 1)
+            list(processor.pdf_to_images(paths['scanned_image']))
+            self.assertEqual(processor.stats, {'pages': 2, 'fast_path_pages': 2})
+            list(processor.pdf_to_images(paths['mixed']))
+            self.assertEqual(processor.stats['fast_path_pages'], 0)
+    
+    def test_run_benchmarks_with_fake_model(self):
+        """Test a small benchmark run reports every stage."""
+        report = bench.run_benchmarks(Config(dpi=72), pages=1, repeat=1, cases=['text_only'])
+        
+        self.assertEqual(report['model'], 'fake')
+        self.assertEqual(set(report['stages']), {
+            'render/text_only', 'resize/text_only', 'preprocess/text_only', 'generate/text_only'
+        })
+        self.assertEqual(report['stages']['generate/text_only']['new_tokens'], 64)
+    
+    def test_compare_to_baseline(self):
+        """Test regressions are flagged against default and per-stage thresholds."""
+        baseline = {'model': 'fake', 'stages': {
+            'render/a': {'ms_per_page': 10.0},
+            'generate/a': {'ms_per_page': 10.0},
+            'resize/a': {'ms_per_page': 10.0},
+        }}
+        report = {'model': 'fake', 'stages': {
+            'render/a': {'ms_per_page': 13.0},
+            'generate/a': {'ms_per_page': 13.0},
+            'resize/a': {'ms_per_page': 9.0},
+            'preprocess/a': {'ms_per_page': 5.0},
+        }}
+        
+        comparisons = bench.compare_to_baseline(report, baseline, threshold=0.2,
+                                                stage_thresholds={'generate': 0.5})
+        regressed = {c['stage']: c['regressed'] for c in comparisons}
+        
+        self.assertEqual(regressed, {'render/a': True, 'generate/a': False, 'resize/a': False})
+
+
 class TestUtils(unittest.TestCase):
     """Test cases for utility functions."""
     
@@ -171,6 +1247,36 @@ class TestUtils(unittest.TestCase):
             os.unlink(pdf_path)
             os.unlink(jpg_path)
     
+    def test_file_fingerprint(self):
+        """Test file fingerprints depend on content only."""
+        paths = []
+        for content in (b'same', b'same', b'other'):
+            with tempfile.NamedTemporaryFile(delete=False) as tmp:
+                tmp.write(content)
+                paths.append(tmp.name)
+        
+        try:
+            self.assertEqual(file_fingerprint(paths[0]), file_fingerprint(paths[1]))
+            self.assertNotEqual(file_fingerprint(paths[0]), file_fingerprint(paths[2]))
+        finally:
+            for path in paths:
+                os.unlink(path)
+    
+    def test_document_helpers(self):
+        """Test manifests, document fingerprints and per-document output paths."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            image_path = os.path.join(tmpdir, 'page.png')
+            Image.new('RGB', (8, 8)).save(image_path)
+            manifest = os.path.join(tmpdir, 'manifest.txt')
+            with open(manifest, 'w', encoding='utf-8') as f:
+                f.write(f"# inputs\n{image_path}\n\n  {tmpdir}  \n")
+            
+            self.assertEqual(read_manifest(manifest), [image_path, tmpdir])
+            self.assertEqual(document_fingerprint(image_path), file_fingerprint(image_path))
+            self.assertEqual(document_fingerprint(tmpdir), sequence_fingerprint([image_path]))
+            self.assertEqual(output_file_path(tmpdir, 7, '/a/doc.pdf'),
+                             os.path.join(tmpdir, '000007_doc.json'))
+    
     def test_setup_logging(self):
         """Test logging setup."""
         # This should not raise an exception